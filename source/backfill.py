@@ -0,0 +1,163 @@
+""" Channel history backfill module.
+
+Crawls several text channels at once, so cold start time depends on
+the largest channel instead of the sum over all of them. Messages are
+streamed page by page into statistics, nothing is kept in memory.
+"""
+
+# Type annotation imports
+from __future__ import annotations
+from typing import AsyncIterator, TYPE_CHECKING
+
+# Asynchronous scheduling dependencies
+import asyncio
+import datetime
+
+# Discord.py API dependencies
+import discord
+
+# Debug output logger
+from utils.logger import debug_output
+
+# Import Spunya for typechecking
+if TYPE_CHECKING: from spunya import Spunya
+
+async def batched(
+        messages: AsyncIterator[discord.Message],
+        size: int) -> AsyncIterator[list[discord.Message]]:
+    """ Group streamed messages into lists of at most 'size' elements."""
+    batch: list[discord.Message] = []
+    async for message in messages:
+        batch.append(message)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if len(batch) != 0:
+        yield batch
+
+class Cursor():
+    """ Resumable position of a single channel crawl.
+
+    Channels are crawled oldest first from the stored mark, never parsed
+    channels from 'horizon'. Channel mark follows every parsed page, so an
+    interrupted crawl resumes from it and older history is never skipped.
+    Crawl stops at 'before', newer messages are handled by 'on_message'.
+    """
+
+    def __init__(self, mark: (int | None), before: int, horizon: int):
+        """ Cursor initializer, 'before' and 'horizon' are snowflakes."""
+        self.after: int = horizon if mark is None else mark
+        self.before: int = before
+        self.count: int = 0
+
+    def history(self, channel: discord.TextChannel) -> AsyncIterator[discord.Message]:
+        """ Channel history iterator starting at current position."""
+        return channel.history(
+            limit=None,
+            after=discord.Object(id=self.after),
+            before=discord.Object(id=self.before),
+            oldest_first=True)
+
+    def advance(self, batch: list[discord.Message]) -> None:
+        """ Move position past parsed 'batch'."""
+        self.after = batch[-1].id
+        self.count += len(batch)
+
+class Backfill():
+    """ Concurrent, rate limit aware channel crawler."""
+
+    def __init__(
+            self,
+            bot: Spunya,
+            guild_id: int,
+            marks: dict[int, int],
+            concurrency: int = 4,
+            horizon_days: float = 30,
+            before: (int | None) = None,
+            retries: int = 5,
+            backoff: float = 2.0,
+            batch_size: int = 100):
+        """ Backfill initializer.
+
+        Keyword arguments:
+        guild_id -- Guild the crawled messages are published to statistics of.
+        marks -- Last parsed message id of every guild channel.
+        concurrency -- Maximum number of channels crawled at the same time.
+        horizon_days -- Age of the oldest message crawled in never parsed channels.
+        before -- Snowflake crawls stop at, the moment of backfill start by default.
+        retries -- Number of attempts for a channel failing with 429 or 5xx.
+        backoff -- Initial delay in seconds between attempts, doubled every retry.
+        batch_size -- Number of messages parsed between yields to the event loop.
+        """
+        self.bot: Spunya = bot
+        self.guild_id: int = guild_id
+        self.marks: dict[int, int] = marks
+        now = discord.utils.utcnow()
+        self.before: int = discord.utils.time_snowflake(now) if before is None else before
+        self.horizon: int = discord.utils.time_snowflake(now - datetime.timedelta(days=horizon_days))
+        self.semaphore: asyncio.Semaphore = asyncio.Semaphore(max(concurrency, 1))
+        self.retries: int = retries
+        self.backoff: float = backoff
+        self.batch_size: int = batch_size
+        self.total: int = 0
+        self.done: int = 0
+        self.failed: list[int] = []
+
+    async def run(self, channels: list[discord.TextChannel]) -> None:
+        """ Crawl every channel, failed channels do not stop the others."""
+        self.total = len(channels)
+        self.done = 0
+        self.failed = []
+        await asyncio.gather(*(self.crawl(channel) for channel in channels))
+        debug_output(
+            f"Backfill finished: {self.done - len(self.failed)}/{self.total} channels, "
+            f"failed: {self.failed}", 1)
+
+    async def crawl(self, channel: discord.TextChannel) -> None:
+        """ Parse single channel retrying on rate limits and server errors."""
+        async with self.semaphore:
+            delay: float = self.backoff
+            cursor = Cursor(self.marks.get(channel.id), self.before, self.horizon)
+            for attempt in range(1, self.retries + 1):
+                try:
+                    await self.parse_channel(channel, cursor)
+                    break
+                except discord.RateLimited as e:
+                    delay = max(delay, e.retry_after)
+                except discord.Forbidden:
+                    debug_output(f"No access to text channel {channel.name}[{channel.id}]", 1)
+                    self.failed.append(channel.id)
+                    break
+                except discord.HTTPException as e:
+                    if e.status != 429 and e.status < 500:
+                        debug_output(f"Failed to load {channel.name}[{channel.id}]: {e}", 0)
+                        self.failed.append(channel.id)
+                        break
+                except Exception as e: # pylint: disable=broad-except
+                    debug_output(f"Exception caught in {channel.name}[{channel.id}]: {e}", 0)
+                    self.failed.append(channel.id)
+                    break
+                if attempt == self.retries:
+                    debug_output(f"Gave up loading {channel.name}[{channel.id}]", 0)
+                    self.failed.append(channel.id)
+                    break
+                debug_output(
+                    f"Rate limited on {channel.name}[{channel.id}], retry in {delay:.1f} s", 1)
+                await asyncio.sleep(delay)
+                delay *= 2
+            self.done += 1
+            debug_output(
+                f"Loaded {cursor.count} from text channel {channel.name}[{channel.id}], "
+                f"progress: {self.done}/{self.total} channels", 1)
+
+    async def parse_channel(self, channel: discord.TextChannel, cursor: Cursor) -> None:
+        """ Extracts info from text channel.
+
+        Every page is parsed as soon as it arrives, so partial statistics are
+        available during backfill and a retry continues from the last page.
+        """
+        async for batch in batched(cursor.history(channel), self.batch_size):
+            self.bot.parse_messages(self.guild_id, batch)
+            cursor.advance(batch)
+            # let gateway events run between pages
+            await asyncio.sleep(0)
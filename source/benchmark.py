@@ -0,0 +1,243 @@
+""" Spunya benchmarks entry module.
+
+NOTE: run from repository root, e.g. "python3 source/benchmark.py ocr images/*.png".
+"""
+
+# Type annotation imports
+from __future__ import annotations
+from typing import Any, Callable
+
+# Benchmark dependencies
+import argparse
+import os
+import random
+import re
+import statistics
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+# Image dependencies
+from PIL import Image
+
+# Spunya dependencies
+from utils.ocr_backend import BACKENDS, create_backend, init_worker
+from utils.image_loader import extract_text
+from utils.json_loader import load_json
+from logic.artifacts import extract_substats
+from utils.tokenizer import Tokenizer
+from storage import Vocabulary, WordCounts
+
+def report(name: str, samples: list[float]) -> None:
+    """ Print latency summary of 'samples' in seconds."""
+    samples = sorted(samples)
+    print(
+        f"{name:<24} n={len(samples):<5} "
+        f"mean={statistics.mean(samples) * 1000:8.1f} ms  "
+        f"p50={samples[len(samples) // 2] * 1000:8.1f} ms  "
+        f"max={samples[-1] * 1000:8.1f} ms")
+
+def measure(func: Callable[[], object], repeat: int) -> list[float]:
+    """ Run 'func' 'repeat' times and collect durations."""
+    samples: list[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def bench_ocr(args: argparse.Namespace) -> None:
+    """ Compare per-image latency and throughput of OCR backends."""
+    images: list[bytes] = []
+    for path in args.images:
+        with open(path, "rb") as file:
+            images.append(file.read())
+
+    for name in args.backends:
+        # engine start-up is paid once per worker process
+        start = time.perf_counter()
+        backend = create_backend(name)
+        print(f"{name}: engine start {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        # single image latency with warm engine
+        samples: list[float] = []
+        for data in images:
+            img = Image.open(BytesIO(data))
+            img.load()
+            samples += measure(lambda: backend.image_to_string(img), args.repeat)
+        report(f"{name} latency", samples)
+        backend.close()
+
+        # throughput of worker pool as used by the bot
+        with ProcessPoolExecutor(
+                max_workers=args.workers,
+                initializer=init_worker,
+                initargs=(name,)) as pool:
+            # warm up every worker
+            list(pool.map(extract_text, images[:1] * args.workers))
+            start = time.perf_counter()
+            list(pool.map(extract_text, images * args.repeat))
+            elapsed = time.perf_counter() - start
+        print(f"{name} throughput: {len(images) * args.repeat / elapsed:.2f} images/s "
+              f"with {args.workers} workers")
+
+def bench_preprocess(args: argparse.Namespace) -> None:
+    """ Compare OCR time and stat extraction accuracy with and without preprocessing.
+
+    Corpus directory holds screenshots with '<name>.json' files next to them:
+    {"level": 20, "substats": [["крит. урон", "percent", 7.8], ...]}
+    """
+    init_worker(args.backend)
+    corpus: list[tuple[bytes, dict[str, Any]]] = []
+    for name in sorted(os.listdir(args.corpus)):
+        path = os.path.join(args.corpus, name)
+        expected_path = os.path.splitext(path)[0] + ".json"
+        if name.endswith(".json") or not os.path.exists(expected_path):
+            continue
+        with open(path, "rb") as file:
+            corpus.append((file.read(), load_json(expected_path)))
+    print(f"corpus: {len(corpus)} images")
+
+    for crop in (False, True):
+        samples: list[float] = []
+        found, total, levels = 0, 0, 0
+        for data, expected in corpus:
+            start = time.perf_counter()
+            text = extract_text(data, crop)
+            samples.append(time.perf_counter() - start)
+            level, stats = extract_substats(text)
+            levels += level == expected["level"]
+            for stat_name, mode, value in expected["substats"]:
+                total += 1
+                found += any(
+                    (name, found_mode) == (stat_name, mode) and abs(found_value - value) < 0.05
+                    for name, found_mode, found_value in stats)
+        report("preprocessed" if crop else "full screenshot", samples)
+        print(f"{'':<24} substats {found}/{total} ({found / max(total, 1):.0%}), "
+              f"levels {levels}/{len(corpus)}")
+
+# alphabet and extras of synthetic chat messages
+LETTERS: str = "абвгдеёжзийклмнопрстуфхцчшщъыьэюя"
+EXTRAS: list[str] = ["<@1029056504780832808>", "<:pepe:1029056504780832808>", "https://example.com/a_b", "123", "!!", "?"]
+
+def synthetic_messages(count: int, vocabulary: int = 5000, seed: int = 0) -> list[str]:
+    """ Random chat-like messages with Zipf distributed words."""
+    rng = random.Random(seed)
+    words = [
+        "".join(rng.choice(LETTERS) for _ in range(rng.randint(2, 10)))
+        for _ in range(vocabulary)]
+    weights = [1 / (rank + 1) for rank in range(vocabulary)]
+    messages: list[str] = []
+    for _ in range(count):
+        message = rng.choices(words, weights, k=rng.randint(1, 20))
+        if rng.random() < 0.2:
+            message.append(rng.choice(EXTRAS))
+        messages.append(" ".join(message))
+    return messages
+
+def legacy_count(texts: list[str], words: dict[str, int]) -> None:
+    """ Word counting as it was done before tokenizer module."""
+    for text in texts:
+        for word in text.split():
+            word = re.sub(r"\W|\d|_", "", word).lower()
+            if len(word) <= 3:
+                continue
+            if not word in words:
+                words[word] = 1
+            else:
+                words[word] += 1
+
+def bench_tokenizer(args: argparse.Namespace) -> None:
+    """ Compare word counting of tokenizer module and previous implementation."""
+    messages = synthetic_messages(args.messages)
+    tokenizer = Tokenizer()
+    batches = [messages[i:i + args.batch] for i in range(0, len(messages), args.batch)]
+
+    def per_message() -> None:
+        words: dict[str, int] = {}
+        for message in messages:
+            tokenizer.count([message], words)
+
+    def per_batch() -> None:
+        words: dict[str, int] = {}
+        for batch in batches:
+            tokenizer.count(batch, words)
+
+    print(f"{args.messages} messages, batch {args.batch}")
+    report("legacy", measure(lambda: legacy_count(messages, {}), args.repeat))
+    report("tokenizer per message", measure(per_message, args.repeat))
+    report("tokenizer batch", measure(per_batch, args.repeat))
+
+def allocated(build: Callable[[], object]) -> tuple[int, object]:
+    """ Bytes held by object returned from 'build'."""
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, result
+
+def bench_memory(args: argparse.Namespace) -> None:
+    """ Compare memory of per-user word dicts and interned vocabulary counts."""
+    messages = synthetic_messages(args.messages, args.vocabulary)
+    rng = random.Random(1)
+    authors = [rng.randrange(args.users) for _ in messages]
+    by_author: dict[int, list[str]] = {}
+    for author, message in zip(authors, messages):
+        by_author.setdefault(author, []).append(message)
+    tokenizer = Tokenizer()
+
+    def build_legacy() -> object:
+        users: dict[int, dict[str, int]] = {}
+        for author, texts in by_author.items():
+            legacy_count(texts, users.setdefault(author, {}))
+        return users
+
+    def build_interned() -> object:
+        vocabulary = Vocabulary()
+        users: dict[int, WordCounts] = {}
+        for author, texts in by_author.items():
+            users.setdefault(author, WordCounts(vocabulary)).add(tokenizer.tokenize_many(texts))
+        return users, vocabulary
+
+    legacy, _ = allocated(build_legacy)
+    interned, _ = allocated(build_interned)
+    print(f"{args.messages} messages, {len(by_author)} users, vocabulary {args.vocabulary}")
+    print(f"{'dict[str, int] per user':<28} {legacy / 2 ** 20:8.1f} MiB")
+    print(f"{'interned vocabulary':<28} {interned / 2 ** 20:8.1f} MiB ({interned / legacy:.0%})")
+
+def main() -> None:
+    """ Parse command line and run selected benchmark."""
+    parser = argparse.ArgumentParser(description="Spunya benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    ocr = subparsers.add_parser("ocr", help="OCR backends latency and throughput")
+    ocr.add_argument("images", nargs="+", help="artifact screenshots")
+    ocr.add_argument("--backends", nargs="+", default=list(BACKENDS.keys()), choices=BACKENDS.keys())
+    ocr.add_argument("--repeat", type=int, default=5)
+    ocr.add_argument("--workers", type=int, default=2)
+    ocr.set_defaults(run=bench_ocr)
+
+    crop = subparsers.add_parser("preprocess", help="OCR time and accuracy of image preprocessing")
+    crop.add_argument("corpus", help="directory with screenshots and expected '.json' stats")
+    crop.add_argument("--backend", default="tesserocr", choices=BACKENDS.keys())
+    crop.set_defaults(run=bench_preprocess)
+
+    words = subparsers.add_parser("tokenizer", help="message word counting speed")
+    words.add_argument("--messages", type=int, default=100000)
+    words.add_argument("--batch", type=int, default=100)
+    words.add_argument("--repeat", type=int, default=5)
+    words.set_defaults(run=bench_tokenizer)
+
+    memory = subparsers.add_parser("memory", help="per-user word counts memory")
+    memory.add_argument("--messages", type=int, default=50000)
+    memory.add_argument("--users", type=int, default=500)
+    memory.add_argument("--vocabulary", type=int, default=20000)
+    memory.set_defaults(run=bench_memory)
+
+    args = parser.parse_args()
+    args.run(args)
+
+### Benchmarks entry
+if __name__ == "__main__":
+    main()
@@ -9,46 +9,47 @@ import datetime
 import discord
 
 # Debug output logger
-from utils.logger import debug_output
+from utils.logger import log
 
 # Import Spunya for typechecking
 if TYPE_CHECKING: from spunya import Spunya
 
 async def on_create(bot: Spunya, channel: discord.abc.GuildChannel) -> None:
     """ Bot noticed a new channel."""
-    debug_output(f"Channel '{channel.name}'[{channel.id}] was created.", 1)
+    log(1, "Channel %r was created.", channel.name, channel=channel.id)
 
 async def on_delete(bot: Spunya, channel: discord.abc.GuildChannel) -> None:
     """ Bot noticed a channel delete."""
-    debug_output(f"Channel '{channel.name}'[{channel.id}] was deleted.", 1)
+    log(1, "Channel %r was deleted.", channel.name, channel=channel.id)
+    bot.message_filter.forget_channel(channel)
 
 async def on_update(
         bot: Spunya,
         before: discord.abc.GuildChannel,
         after: discord.abc.GuildChannel) -> None:
     """ Bot noticed a channel update."""
-    debug_output(f"Channel '{before.name}'[{before.id}] was updated.", 1)
+    log(1, "Channel %r was updated.", before.name, channel=before.id)
 
 async def on_pins_update(
         bot: Spunya,
         channel: (discord.abc.GuildChannel | discord.Thread),
         last_pin: (datetime.datetime | None)) -> None:
     """ Bot noticed pins update."""
-    debug_output(f"Channel or thread '{channel.name}'[{channel.id}] pin was updated.", 1)
+    log(1, "Channel or thread %r pin was updated.", channel.name, channel=channel.id)
 
 async def on_private_update(
         bot: discord.Client,
         before: discord.GroupChannel,
         after: discord.GroupChannel) -> None:
     """ Bot noticed private channel update."""
-    debug_output(f"Private channel '{before.name}'[{before.id}] was updated.", 1)
+    log(1, "Private channel %r was updated.", before.name, channel=before.id)
 
 async def on_private_pins_update(
         bot: Spunya,
         channel: discord.abc.PrivateChannel,
         last_pin: (datetime.datetime | None)) -> None:
     """ Bot noticed private pin update."""
-    debug_output(f"Private channel '{channel.id}' pin was updated.", 1)
+    log(1, "Private channel pin was updated.", channel=channel.id)
 
 async def on_typing(
         bot: Spunya,
@@ -7,36 +7,36 @@ from typing import TYPE_CHECKING
 # Discord.py API dependencies
 import discord
 
-# Spunya dependencies
-import storage
-
 # Debug output logger
-from utils.logger import debug_output
+from utils.logger import log
 
 # Import Spunya for typechecking
 if TYPE_CHECKING: from spunya import Spunya
 
 async def on_join(bot: Spunya, member: discord.Member) -> None:
     """ Bot noticed a joined member."""
-    bot.stats[member.id] = storage.UserStats(member)
-    debug_output(f"{member} has joined a guild.", 1)
+    log(1, "%s has joined a guild.", member, guild=member.guild.id, user=member.id)
 
 async def on_remove(bot: Spunya, member: discord.Member) -> None:
     """ Bot noticed a removed member."""
-    debug_output(f"{member} has left a guild.", 1)
+    log(1, "%s has left a guild.", member, guild=member.guild.id, user=member.id)
+    bot.message_filter.forget_member(member.guild.id, member.id)
 
 async def on_update(bot: Spunya, before: discord.Member, after: discord.Member) -> None:
     """ Bot noticed a member update."""
-    debug_output(f"{before} updated their profile.", 2)
+    log(2, "%s updated their profile.", before, guild=before.guild.id, user=before.id)
+    # cached verdict depends on member roles only
+    if before.roles != after.roles:
+        bot.message_filter.forget_member(after.guild.id, after.id)
 
 async def on_ban(bot: Spunya, guild: discord.Guild, user: (discord.User | discord.Member)) -> None:
     """ Bot noticed a member ban."""
-    debug_output(f"{user} was banned on guild {guild}.", 1)
+    log(1, "%s was banned on guild %s.", user, guild, guild=guild.id, user=user.id)
 
 async def on_unban(bot: Spunya, guild: discord.Guild, user: discord.User) -> None:
     """ Bot noticed a member unban."""
-    debug_output(f"{user} was unbanned on guild {guild}.", 1)
+    log(1, "%s was unbanned on guild %s.", user, guild, guild=guild.id, user=user.id)
 
 async def on_presence_update(bot: Spunya, before: discord.Member, after: discord.Member) -> None:
     """ Bot noticed a member presence change."""
-    debug_output(f"{before} presence status was updated.", 3)
+    log(3, "%s presence status was updated.", before, guild=before.guild.id, user=before.id)
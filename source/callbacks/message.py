@@ -10,110 +10,101 @@ import time
 
 # Discord.py API dependencies
 import discord
-from discord.utils import get
 
 # Debug output logger
-from utils.logger import debug_output
-from utils.json_loader import load_json
-from utils.image_loader import load_text_image
+from utils.logger import log
+from utils.image_loader import PipelineFull
+from utils.triggers import Trigger
 
 # Parse artifact module
 from logic.artifacts import parse_artifact
 
 # Import Spunya for typechecking
-if TYPE_CHECKING:
-    from spunya import Spunya
-    import storage
+if TYPE_CHECKING: from spunya import Spunya
 
 ### Helper functions for sending replies.
 #
 #
 
-# load all replies from 'communication.json'
-replies: dict[str, Any] = cast(dict[str, Any], load_json("resources/communication.json"))
-
 async def send(
+    bot: Spunya,
     channel: discord.abc.MessageableChannel,
     text: str,
     reference: (discord.Message | discord.MessageReference | discord.PartialMessage | None) = None) -> None:
-    """ Send or reply with text string."""
-
-    # time to react on invocation
-    time.sleep(random.randint(0, 2))
-    # suppose that spunya types in around 300 cpm = 5 cps
-    typing_time = len(text) / 5
-    # set "typing..." for `typing_time` seconds
-    async with channel.typing():
-        time.sleep(min(typing_time, 5))
-    # send message
-    if reference is not None:
-        await channel.send(text, reference = reference)
-    else:
-        await channel.send(text)
+    """ Send or reply with text string.
+
+    Reply is delivered by bot reply scheduler after reaction and typing delays,
+    this coroutine returns immediately.
+    """
+    bot.replies.schedule(channel, text, reference)
 
 async def random_answer(
+        bot: Spunya,
         message: discord.Message,
         answers: list[str],
         rand_reply: bool = True) -> None:
     """ Produce randomly selected answer from list."""
     answer: str = answers[random.randint(0, len(answers) - 1)]
     if rand_reply and random.randint(0, 9) == 4:
-        await send(message.channel, answer, message)
+        await send(bot, message.channel, answer, message)
     else:
-        await send(message.channel, answer)
+        await send(bot, message.channel, answer)
 
-async def answer_question(
-        bot: Spunya,
-        message:
-        discord.Message,
-        questions: dict[str, list[str]]) -> None:
+async def answer_question(bot: Spunya, message: discord.Message, trigger: Trigger) -> None:
     """ Answer question that was asked in 'message'."""
-    question = list(filter(lambda x: x in message.content, questions.keys()))[0]
-    await random_answer(message, questions[question])
+    await random_answer(bot, message, trigger.answers)
 
-async def say_goodbye(
-        bot: Spunya,
-        message: discord.Message,
-        goodbyes: dict[str, list[str]]) -> None:
+async def say_goodbye(bot: Spunya, message: discord.Message, trigger: Trigger) -> None:
     """ Say goodbye to uesr."""
-    await random_answer(message, goodbyes["out"])
+    await random_answer(bot, message, trigger.answers)
 
 async def say_greeting(
         bot: Spunya,
+        guild_id: int,
         message: discord.Message,
         greetings: dict[str, list[str]],
         check_cd: bool = True) -> None:
     """ Greet user that sent 'message' with given options."""
     if not check_cd:
-        await random_answer(message, greetings["common"])
+        await random_answer(bot, message, greetings["common"])
         return
-    # check 12h cooldown
+    # check guild greeting cooldown
     local_t: float = time.time()
-    user_stats: storage.UserStats = bot.stats[message.author.id]
-    dt: float = local_t - user_stats.last_message_t
-    if dt / 3600 >= 12:
-        await random_answer(message, greetings["common"])
+    last_message_t: float = await bot.stats.query("last_message_t", guild_id, message.author.id)
+    dt: float = local_t - last_message_t
+    if dt >= bot.guild_configs[guild_id].greet_cd:
+        await random_answer(bot, message, greetings["common"])
 
-async def image_answer(message: discord.Message, img_url: str) -> None:
+async def image_answer(bot: Spunya, message: discord.Message, attachment: discord.Attachment) -> None:
     """ Response to an attached image."""
-    # load image and parse text in it
-    text = load_text_image(img_url)
-
-    # try to rate artifact text data
     answer = "Прости, у меня не получилось прочитать :(\nПопробуй сфотографировать по-другому."
     try:
-        parsed_data = parse_artifact(text)
+        # load image, parse text in it and try to rate artifact text data
+        with bot.metrics.timer("ocr"):
+            _, parsed_data = await bot.ocr.recognize(attachment, parse_artifact)
         if parsed_data != "":
             answer = parsed_data
+    except PipelineFull:
+        answer = "Слишком много картинок сразу, попробуй чуть позже."
     except Exception as e:
-        debug_output(f"Exception caught: {e}", 1)
+        log(1, "Exception caught: %s", e, attachment=attachment.id)
     finally:
         # send answer
-        await send(message.channel, answer)
-
-async def rate_artifact(message: discord.Message) -> None:
+        await send(bot, message.channel, answer)
+
+def image_attachment(message: discord.Message) -> (discord.Attachment | None):
+    """ Image attached to message or to the message it replies to."""
+    attachments = list(message.attachments)
+    if message.reference is not None and isinstance(message.reference.resolved, discord.Message):
+        attachments += message.reference.resolved.attachments
+    for attachment in attachments:
+        if str(attachment.content_type).startswith("image"):
+            return attachment
+    return None
+
+async def rate_artifact(bot: Spunya, message: discord.Message, attachment: discord.Attachment) -> None:
     """ Rate artifact from attached image."""
-    await image_answer(message, message.attachments[0].url)
+    await image_answer(bot, message, attachment)
 
 ### Message callbacks handle module.
 #
@@ -121,51 +112,44 @@ async def rate_artifact(message: discord.Message) -> None:
 
 async def on_recieve(bot: Spunya, message: discord.Message) -> None:
     """ Bot noticed a new message."""
-    debug_output(f"New message: '{message.content}'", 3)
+    # drop messages of other guilds, ignored channels and ignored authors first
+    if not bot.message_filter.accepts(message): return
+    log(3, "New message: %r", message.content, channel=message.channel.id, user=message.author.id)
 
-    # ensure message was recieved from guild
-    if message.guild is None: return
+    # ensure message was recieved from served guild
     if message.author is discord.User: return
-    guild: discord.Guild = message.guild
-    author: discord.Member = cast(discord.Member, message.author)
+    guild: discord.Guild = cast(discord.Guild, message.guild)
     content: str = message.content.lower()
 
-    # skip bots
-    if author.id == bot.application_id:
-        return
-    if get(guild.roles, id = 1029056504780832808) in author.roles:
-        return
-
     # load replies
-    greetings: dict[str, Any] = replies["greetings"]
-    questions: dict[str, Any] = replies["questions"]
-    goodbyes: dict[str, Any] = replies["goodbyes"]
+    greetings: dict[str, Any] = bot.communication.replies["greetings"]
 
     # process answers
     if message.content.startswith(f"<@{bot.application_id}>"):
-        if len(message.attachments) != 0 and message.attachments[0].content_type == "image":
-            # try to rate artifact if image attached
-            await rate_artifact(message)
-        elif any(_ in content for _ in questions.keys()):
+        attachment = image_attachment(message)
+        trigger = None if attachment is not None else bot.communication.match(content)
+        if attachment is not None:
+            # try to rate artifact if image attached or replied to
+            await rate_artifact(bot, message, attachment)
+        elif trigger is not None and trigger.category == "questions":
             # try to answer question if question word was found
-            await answer_question(bot, message, questions)
-        elif any(_ in content for _ in goodbyes["in"]):
+            await answer_question(bot, message, trigger)
+        elif trigger is not None and trigger.category == "goodbyes":
             # say goodbye to user
-            await say_goodbye(bot, message, goodbyes)
+            await say_goodbye(bot, message, trigger)
         else:
             # greet user if was tagged
-            await say_greeting(bot, message, greetings, check_cd = False)
-    elif author.id in bot.stats:
+            await say_greeting(bot, guild.id, message, greetings, check_cd = False)
+    else:
         # greet user if cooldown passed
-        await say_greeting(bot, message, greetings, check_cd = True)
+        await say_greeting(bot, guild.id, message, greetings, check_cd = True)
 
     # parse message
-    if message.author.id in bot.stats:
-        bot.stats[message.author.id].parse_message(message)
+    bot.parse_messages(guild.id, [message], live = True)
 
 async def on_edit(bot: Spunya, before: discord.Message, after: discord.Message) -> None:
     """ Bot noticed a message edit in channel."""
-    debug_output(f"Edited message: '{after.content}'", 3)
+    log(3, "Edited message: %r", after.content, message=after.id)
     if before is None or after is None:
         return
     if before.content != after.content:
@@ -173,4 +157,21 @@ async def on_edit(bot: Spunya, before: discord.Message, after: discord.Message)
 
 async def on_delete(bot: Spunya, message: discord.Message) -> None:
     """ Bot noticed a message delete in channel."""
-    debug_output(f"Deleted message: '{message.content}'", 3)
+    log(3, "Deleted message: %r", message.content, message=message.id)
+
+async def on_raw_edit(bot: Spunya, payload: discord.RawMessageUpdateEvent) -> None:
+    """ Bot noticed any message edit, cached or not."""
+    content = payload.data.get("content")
+    if content is not None and bot.serves(payload.guild_id):
+        bot.stats.publish("edit", payload.guild_id, payload.message_id, content)
+
+async def on_raw_delete(bot: Spunya, payload: discord.RawMessageDeleteEvent) -> None:
+    """ Bot noticed any message delete, cached or not."""
+    if bot.serves(payload.guild_id):
+        bot.stats.publish("forget", payload.guild_id, [payload.message_id])
+
+async def on_raw_bulk_delete(bot: Spunya, payload: discord.RawBulkMessageDeleteEvent) -> None:
+    """ Bot noticed several messages deleted at once."""
+    if bot.serves(payload.guild_id):
+        bot.stats.publish("forget", payload.guild_id, list(payload.message_ids))
+    log(3, "%d messages were deleted.", len(payload.message_ids), channel=payload.channel_id)
@@ -8,7 +8,7 @@ from typing import TYPE_CHECKING
 import discord
 
 # Debug output logger
-from utils.logger import debug_output
+from utils.logger import log
 
 # Import Spunya for typechecking
 if TYPE_CHECKING: from spunya import Spunya
@@ -18,24 +18,24 @@ async def on_add(
         reaction: discord.Reaction,
         user: (discord.Member | discord.User)) -> None:
     """ Bot noticed added reaction."""
-    debug_output(f"{user} added a reaction {reaction}.", 2)
+    log(2, "%s added a reaction %s.", user, reaction, message=reaction.message.id)
 
 async def on_sub(
         bot: Spunya,
         reaction: discord.Reaction,
         user: (discord.Member | discord.User)) -> None:
     """ Bot noticed withdrawn reaction."""
-    debug_output(f"{user} remove a reaction {reaction}.", 2)
+    log(2, "%s removed a reaction %s.", user, reaction, message=reaction.message.id)
 
 async def on_clear(
         bot: Spunya,
         message: discord.Message,
         reactions: list[discord.Reaction]) -> None:
     """ Bot noticed all message reactions clear."""
-    debug_output(f"All reactions from {message} were removed.", 2)
+    log(2, "All reactions were removed.", message=message.id)
 
 async def on_remove(
         bot: Spunya,
         reaction: discord.Reaction) -> None:
     """ Bot noticed reaction delete."""
-    debug_output(f"Reaction {reaction} was removed.", 2)
+    log(2, "Reaction %s was removed.", reaction, message=reaction.message.id)
@@ -8,19 +8,20 @@ from typing import TYPE_CHECKING
 import discord
 
 # Debug output logger
-from utils.logger import debug_output
+from utils.logger import log
 
 # Import Spunya for typechecking
 if TYPE_CHECKING: from spunya import Spunya
 
 async def on_create(bot: Spunya, role: discord.Role) -> None:
     """ Bot noticed guild role create."""
-    debug_output(f"Role {role} was added.", 2)
+    log(2, "Role %s was added.", role, guild=role.guild.id, role=role.id)
 
 async def on_delete(bot: Spunya, role: discord.Role) -> None:
     """ Bot noticed guild role delete."""
-    debug_output(f"Role {role} was removed.", 2)
+    log(2, "Role %s was removed.", role, guild=role.guild.id, role=role.id)
+    bot.message_filter.forget_role(role)
 
 async def on_update(bot: Spunya, before: discord.Role, after: discord.Role) -> None:
     """ Bot noticed guild roles update."""
-    debug_output(f"Role {before} was updated.", 2)
+    log(2, "Role %s was updated.", before, guild=before.guild.id, role=before.id)
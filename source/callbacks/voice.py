@@ -0,0 +1,62 @@
+""" Voice state callbacks handling module.
+
+Voice time is accounted in session segments: every state change closes
+the open segment of a member and opens a new one, nothing is polled.
+"""
+
+# Type annotation imports
+from __future__ import annotations
+from typing import TYPE_CHECKING
+import time
+
+# Discord.py API dependencies
+import discord
+
+# Debug output logger
+from utils.logger import log
+
+# Import Spunya for typechecking
+if TYPE_CHECKING: from spunya import Spunya
+
+def voice_mode(
+        state: discord.VoiceState,
+        afk_channel: (discord.VoiceChannel | discord.StageChannel | None)) -> (str | None):
+    """ Voice session segment mode of member in 'state', None if not connected."""
+    if state.channel is None:
+        return None
+    if afk_channel is not None and state.channel.id == afk_channel.id:
+        return "afk"
+    if state.self_mute or state.mute or state.self_deaf or state.deaf:
+        return "muted"
+    return "active"
+
+async def on_state_update(
+        bot: Spunya,
+        member: discord.Member,
+        before: discord.VoiceState,
+        after: discord.VoiceState) -> None:
+    """ Bot noticed a member voice state change."""
+    if member.bot or not bot.serves(member.guild.id):
+        return
+    mode = voice_mode(after, member.guild.afk_channel)
+    if mode == voice_mode(before, member.guild.afk_channel) and before.channel == after.channel:
+        # streaming, video and similar changes do not split sessions
+        return
+    bot.stats.publish("voice", member.guild.id, member.id, mode, time.time())
+    log(3, "%s voice session is now %s.", member, mode, guild=member.guild.id, user=member.id)
+
+def reconcile(bot: Spunya, guild: discord.Guild) -> None:
+    """ Match open voice sessions with members currently connected to 'guild'.
+
+    Members who joined or left while bot was disconnected get their sessions
+    opened or closed now.
+    """
+    connected: dict[int, str] = {}
+    for channel in guild.voice_channels + guild.stage_channels:
+        for user_id, state in channel.voice_states.items():
+            mode = voice_mode(state, guild.afk_channel)
+            member = guild.get_member(user_id)
+            if mode is not None and (member is None or not member.bot):
+                connected[user_id] = mode
+    bot.stats.publish("reconcile", guild.id, connected, time.time())
+    log(2, "%d members are in voice channels of %s.", len(connected), guild.name, guild=guild.id)
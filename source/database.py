@@ -0,0 +1,251 @@
+""" Persistent database module.
+
+Keeps a snapshot of collected user statistics in a local SQLite file
+together with per-channel "last seen message" marks, so the bot only needs
+to fetch messages newer than the mark after restart.
+"""
+
+# Type annotation imports
+from __future__ import annotations
+from typing import Callable, Dict, List, Tuple, TypeVar
+
+# Database, serialization and threading dependencies
+import asyncio
+import json
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+T = TypeVar("T")
+
+# list of schema migrations, index + 1 is a resulting 'user_version'
+MIGRATIONS: list[str] = [
+    """
+    CREATE TABLE users (
+        user_id INTEGER PRIMARY KEY,
+        message_count INTEGER NOT NULL,
+        last_message_t REAL NOT NULL,
+        voice_t REAL NOT NULL
+    );
+    CREATE TABLE words (
+        user_id INTEGER NOT NULL,
+        word TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (user_id, word)
+    ) WITHOUT ROWID;
+    CREATE TABLE channels (
+        channel_id INTEGER PRIMARY KEY,
+        last_message_id INTEGER NOT NULL
+    );
+    """,
+    """
+    ALTER TABLE users ADD COLUMN activity TEXT NOT NULL DEFAULT '{}';
+    CREATE TABLE channel_activity (
+        channel_id INTEGER PRIMARY KEY,
+        activity TEXT NOT NULL
+    );
+    """,
+    """
+    ALTER TABLE users ADD COLUMN muted_t REAL NOT NULL DEFAULT 0;
+    ALTER TABLE users ADD COLUMN afk_t REAL NOT NULL DEFAULT 0;
+    """,
+    # rows of single guild versions get guild 0 and are adopted on load
+    """
+    CREATE TABLE guild_users (
+        guild_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        message_count INTEGER NOT NULL,
+        last_message_t REAL NOT NULL,
+        voice_t REAL NOT NULL,
+        activity TEXT NOT NULL DEFAULT '{}',
+        muted_t REAL NOT NULL DEFAULT 0,
+        afk_t REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (guild_id, user_id)
+    );
+    INSERT INTO guild_users
+        SELECT 0, user_id, message_count, last_message_t, voice_t, activity, muted_t, afk_t FROM users;
+    DROP TABLE users;
+    ALTER TABLE guild_users RENAME TO users;
+    CREATE TABLE guild_words (
+        guild_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        word TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (guild_id, user_id, word)
+    ) WITHOUT ROWID;
+    INSERT INTO guild_words SELECT 0, user_id, word, count FROM words;
+    DROP TABLE words;
+    ALTER TABLE guild_words RENAME TO words;
+    ALTER TABLE channels ADD COLUMN guild_id INTEGER NOT NULL DEFAULT 0;
+    ALTER TABLE channel_activity ADD COLUMN guild_id INTEGER NOT NULL DEFAULT 0;
+    """,
+]
+
+class UserRecord():
+    """ Stored statistics of a single user."""
+
+    def __init__(
+            self,
+            user_id: int,
+            message_count: int,
+            last_message_t: float,
+            voice_t: float,
+            words: (dict[str, int] | None) = None,
+            activity: (dict[str, list[int]] | None) = None,
+            muted_t: float = 0,
+            afk_t: float = 0):
+        """ User record initializer."""
+        self.user_id: int = user_id
+        self.message_count: int = message_count
+        self.last_message_t: float = last_message_t
+        self.voice_t: float = voice_t
+        self.muted_t: float = muted_t
+        self.afk_t: float = afk_t
+        self.words: dict[str, int] = {} if words is None else words
+        self.activity: dict[str, list[int]] = {} if activity is None else activity
+
+class Snapshot():
+    """ Database contents of a single guild loaded at startup."""
+
+    def __init__(self) -> None:
+        """ Empty snapshot initializer."""
+        self.users: dict[int, UserRecord] = {}
+        self.marks: dict[int, int] = {}
+        self.channels: dict[int, dict[str, list[int]]] = {}
+
+# changed statistics of a guild: guild id, user records, channel marks and channel activity
+GuildChanges = Tuple[int, List[UserRecord], Dict[int, int], Dict[int, Dict[str, List[int]]]]
+
+class Database():
+    """ SQLite database accessed from a single dedicated thread.
+
+    The event loop is never blocked by disk access and the connection
+    is never shared between threads.
+    """
+
+    def __init__(self, path: str, migrations: list[str]):
+        """ Database initializer. Connection is opened on first use."""
+        self.path: str = path
+        self.migrations: list[str] = migrations
+        self.executor: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="spunya-db")
+        self.connection: (sqlite3.Connection | None) = None
+
+    async def run(self, func: Callable[[sqlite3.Connection], T]) -> T:
+        """ Execute 'func' with open connection in database thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.call, func)
+
+    def call(self, func: Callable[[sqlite3.Connection], T]) -> T:
+        """ Execute 'func' with open connection in current thread."""
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            migrate(self.connection, self.migrations)
+        return func(self.connection)
+
+    async def close(self) -> None:
+        """ Close connection and stop database thread."""
+        def close_connection(connection: sqlite3.Connection) -> None:
+            connection.close()
+            self.connection = None
+        if self.connection is not None:
+            await self.run(close_connection)
+        self.executor.shutdown(wait=True)
+
+class StatsDatabase(Database):
+    """ SQLite backed statistics storage partitioned by guild."""
+
+    def __init__(self, path: str, legacy_guild: int = 0):
+        """ Statistics database initializer.
+
+        Rows stored by single guild versions are moved to 'legacy_guild'.
+        """
+        super().__init__(path, MIGRATIONS)
+        self.legacy_guild: int = legacy_guild
+
+    async def load(self) -> dict[int, Snapshot]:
+        """ Load all stored statistics keyed by guild id."""
+        return await self.run(self.read)
+
+    async def save(self, changes: list[GuildChanges]) -> None:
+        """ Overwrite stored statistics, channels and their marks of changed guilds."""
+        await self.run(lambda connection: self.write(connection, changes))
+
+    def read(self, connection: sqlite3.Connection) -> dict[int, Snapshot]:
+        """ Read all stored statistics with open connection."""
+        adopt_legacy_rows(connection, self.legacy_guild)
+        return load_snapshots(connection)
+
+    def write(self, connection: sqlite3.Connection, changes: list[GuildChanges]) -> None:
+        """ Write changed statistics with open connection, every guild in its own transaction."""
+        for guild_id, users, marks, channels in changes:
+            save_snapshot(connection, guild_id, users, marks, channels)
+
+def migrate(connection: sqlite3.Connection, migrations: list[str]) -> None:
+    """ Bring database schema to the latest version."""
+    version: int = connection.execute("PRAGMA user_version").fetchone()[0]
+    for i in range(version, len(migrations)):
+        connection.executescript(migrations[i])
+        connection.execute(f"PRAGMA user_version = {i + 1}")
+    connection.commit()
+
+def adopt_legacy_rows(connection: sqlite3.Connection, guild_id: int) -> None:
+    """ Move rows stored without guild id to 'guild_id'."""
+    if guild_id == 0:
+        return
+    with connection:
+        for table in ("users", "words", "channels", "channel_activity"):
+            connection.execute(f"UPDATE {table} SET guild_id = ? WHERE guild_id = 0", (guild_id,))
+
+def load_snapshots(connection: sqlite3.Connection) -> dict[int, Snapshot]:
+    """ Read every stored table into memory."""
+    snapshots: dict[int, Snapshot] = {}
+    def snapshot(guild_id: int) -> Snapshot:
+        return snapshots.setdefault(guild_id, Snapshot())
+    for guild_id, user_id, message_count, last_message_t, voice_t, activity, muted_t, afk_t in connection.execute(
+            "SELECT guild_id, user_id, message_count, last_message_t, voice_t, activity, muted_t, afk_t FROM users"):
+        snapshot(guild_id).users[user_id] = UserRecord(
+            user_id, message_count, last_message_t, voice_t, None, json.loads(activity), muted_t, afk_t)
+    for guild_id, user_id, word, count in connection.execute(
+            "SELECT guild_id, user_id, word, count FROM words"):
+        users = snapshot(guild_id).users
+        if user_id in users:
+            users[user_id].words[word] = count
+    for guild_id, channel_id, last_message_id in connection.execute(
+            "SELECT guild_id, channel_id, last_message_id FROM channels"):
+        snapshot(guild_id).marks[channel_id] = last_message_id
+    for guild_id, channel_id, activity in connection.execute(
+            "SELECT guild_id, channel_id, activity FROM channel_activity"):
+        snapshot(guild_id).channels[channel_id] = json.loads(activity)
+    return snapshots
+
+def save_snapshot(
+        connection: sqlite3.Connection,
+        guild_id: int,
+        users: list[UserRecord],
+        marks: dict[int, int],
+        channels: dict[int, dict[str, list[int]]]) -> None:
+    """ Write user records, channel activity and channel marks of a guild.
+
+    Statistics and marks are written in a single transaction so they never
+    disagree: a message is either counted and behind the mark, or neither.
+    """
+    with connection:
+        for user in users:
+            connection.execute(
+                "INSERT OR REPLACE INTO users "
+                "(guild_id, user_id, message_count, last_message_t, voice_t, activity, muted_t, afk_t) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (guild_id, user.user_id, user.message_count, user.last_message_t, user.voice_t,
+                 json.dumps(user.activity), user.muted_t, user.afk_t))
+            connection.execute(
+                "DELETE FROM words WHERE guild_id = ? AND user_id = ?", (guild_id, user.user_id))
+            connection.executemany(
+                "INSERT INTO words (guild_id, user_id, word, count) VALUES (?, ?, ?, ?)",
+                [(guild_id, user.user_id, word, count) for word, count in user.words.items()])
+        connection.executemany(
+            "INSERT OR REPLACE INTO channel_activity (channel_id, activity, guild_id) VALUES (?, ?, ?)",
+            [(channel_id, json.dumps(activity), guild_id) for channel_id, activity in channels.items()])
+        connection.executemany(
+            "INSERT OR REPLACE INTO channels (channel_id, last_message_id, guild_id) VALUES (?, ?, ?)",
+            [(channel_id, mark, guild_id) for channel_id, mark in marks.items()])
@@ -0,0 +1,184 @@
+""" Per-guild statistics partition module.
+
+Every served guild owns its statistics, vocabulary, channel marks and
+configuration, so guilds never share state and a partition can be
+loaded, saved or dropped on its own.
+"""
+
+# Type annotation imports
+from __future__ import annotations
+from typing import Any
+
+# Spunya dependencies
+import database
+import storage
+
+# role ignored by single guild configs
+LEGACY_IGNORED_ROLE: int = 1029056504780832808
+
+class GuildConfig():
+    """ Configuration of a single served guild."""
+
+    def __init__(
+            self,
+            guild_id: int,
+            ignored: (list[int] | None) = None,
+            greet_cd: int = 43200,
+            ignored_roles: (list[int] | None) = None,
+            ignored_users: (list[int] | None) = None,
+            ignore_bots: bool = True):
+        """ Guild configuration initializer.
+
+        Keyword arguments:
+        ignored -- Text channels never parsed for statistics.
+        greet_cd -- Seconds of silence after which a member is greeted again.
+        ignored_roles -- Members with any of these roles are neither answered nor counted.
+        ignored_users -- Users neither answered nor counted.
+        ignore_bots -- Skip messages of bots and webhooks.
+        """
+        self.guild_id: int = guild_id
+        self.ignored: frozenset[int] = frozenset(ignored or ())
+        self.greet_cd: int = greet_cd
+        self.ignored_roles: frozenset[int] = frozenset(ignored_roles or ())
+        self.ignored_users: frozenset[int] = frozenset(ignored_users or ())
+        self.ignore_bots: bool = ignore_bots
+
+    @classmethod
+    def from_config(cls, config: dict[str, Any]) -> dict[int, GuildConfig]:
+        """ Served guilds from 'config.json'.
+
+        Guilds are listed in "guilds" object keyed by guild id, old single guild
+        configs with top level "guild_id" and "ignored" are still supported.
+        """
+        guilds = config.get("guilds")
+        if guilds is None:
+            guild_id = int(config["guild_id"])
+            return {guild_id: cls(
+                guild_id,
+                config.get("ignored", []),
+                config.get("greet_cd", 43200),
+                config.get("ignored_roles", [LEGACY_IGNORED_ROLE]),
+                config.get("ignored_users", []),
+                config.get("ignore_bots", True))}
+        return {
+            int(guild_id): cls(
+                int(guild_id),
+                guild.get("ignored", []),
+                guild.get("greet_cd", config.get("greet_cd", 43200)),
+                guild.get("ignored_roles", []),
+                guild.get("ignored_users", []),
+                guild.get("ignore_bots", True))
+            for guild_id, guild in guilds.items()}
+
+class GuildStats():
+    """ Collected statistics of a single guild."""
+
+    def __init__(self, config: GuildConfig, message_cache_size: int = 50000):
+        """ Empty guild statistics initializer."""
+        self.config: GuildConfig = config
+        self.guild_id: int = config.guild_id
+        self.stats: dict[int, storage.UserStats] = {}
+        self.leaderboard: storage.Leaderboard = storage.Leaderboard()
+        self.vocabulary: storage.Vocabulary = storage.Vocabulary()
+        self.channel_activity: dict[int, storage.Activity] = {}
+        self.dirty_channels: set[int] = set()
+        # per-channel last parsed message ids
+        self.marks: dict[int, int] = {}
+        # fingerprints of latest parsed messages for edit and delete corrections
+        self.fingerprints: storage.MessageCache = storage.MessageCache(message_cache_size)
+
+    def restore(self, snapshot: database.Snapshot) -> None:
+        """ Load stored statistics of the guild."""
+        self.marks = snapshot.marks
+        for user_id, record in snapshot.users.items():
+            self.user_stats(user_id).restore(record)
+            self.leaderboard.update(user_id, record.message_count)
+        for channel_id, activity in snapshot.channels.items():
+            self.channel_activity.setdefault(channel_id, storage.Activity()).load(activity)
+
+    def user_stats(self, user_id: int) -> storage.UserStats:
+        """ Statistics of user, created on first access."""
+        result = self.stats.get(user_id)
+        if result is None:
+            result = self.stats[user_id] = storage.UserStats(user_id, self.vocabulary)
+        return result
+
+    def parse_messages(
+            self,
+            channel_id: int,
+            messages: list[storage.MessageEvent],
+            last_message_id: (int | None)) -> None:
+        """ Collects stats from a batch of messages of one channel and moves its mark.
+
+        Every message fingerprint is remembered, so later edits and deletes
+        can be applied as exact deltas. Mark is moved to 'last_message_id',
+        which may belong to a skipped message, None keeps the mark.
+        """
+        words = storage.tokenizer.tokenize_each([_.content for _ in messages])
+        intern = self.vocabulary.intern
+        by_author: dict[int, tuple[list[storage.MessageEvent], list[tuple[int, ...]]]] = {}
+        for message, message_words in zip(messages, words):
+            word_ids = tuple(map(intern, message_words))
+            group = by_author.setdefault(message.author_id, ([], []))
+            group[0].append(message)
+            group[1].append(word_ids)
+            self.fingerprints.remember(message.message_id, storage.MessageFingerprint(
+                message.author_id, channel_id, message.t, word_ids))
+        for author_id, (author_messages, author_words) in by_author.items():
+            user_stats = self.user_stats(author_id)
+            user_stats.parse_messages(author_messages, author_words)
+            self.leaderboard.update(author_id, user_stats.message_count)
+        if len(messages) != 0:
+            self.channel_activity.setdefault(channel_id, storage.Activity()).add(_.t for _ in messages)
+            self.dirty_channels.add(channel_id)
+        if last_message_id is not None:
+            self.marks[channel_id] = max(last_message_id, self.marks.get(channel_id, 0))
+
+    def forget_message(self, message_id: int) -> None:
+        """ Removes stats of a deleted message if it is still remembered."""
+        fingerprint = self.fingerprints.pop(message_id)
+        if fingerprint is None:
+            return
+        user_stats = self.user_stats(fingerprint.author_id)
+        user_stats.forget_message(fingerprint)
+        self.leaderboard.update(fingerprint.author_id, user_stats.message_count)
+        if fingerprint.channel_id in self.channel_activity:
+            self.channel_activity[fingerprint.channel_id].remove(fingerprint.t)
+            self.dirty_channels.add(fingerprint.channel_id)
+
+    def edit_message(self, message_id: int, content: str) -> None:
+        """ Replaces words of an edited message if it is still remembered."""
+        fingerprint = self.fingerprints.get(message_id)
+        if fingerprint is None:
+            return
+        word_ids = tuple(map(self.vocabulary.intern, storage.tokenizer.tokenize(content)))
+        if word_ids != fingerprint.words:
+            self.user_stats(fingerprint.author_id).edit_message(fingerprint, word_ids)
+
+    def changes(self) -> database.GuildChanges:
+        """ Records of users and activity of channels changed since the last call with all marks."""
+        records: list[database.UserRecord] = []
+        for user_stats in self.stats.values():
+            if user_stats.dirty:
+                records.append(user_stats.record())
+                user_stats.dirty = False
+        channels = {_: self.channel_activity[_].as_dict() for _ in self.dirty_channels}
+        self.dirty_channels.clear()
+        return self.guild_id, records, dict(self.marks), channels
+
+    def get_stats(self) -> str:
+        """ Transorms message statistics into printable form."""
+        result = ""
+        for user_id, _ in self.leaderboard.top(3):
+            result += str(self.stats[user_id]) + "\n"
+        return result
+
+    def get_activity(self, window: str, now: float) -> str:
+        """ Transforms messages of the latest 'window' into printable leaderboards."""
+        users = storage.most_active(((_.user_id, _.activity) for _ in self.stats.values()), window, now)
+        channels = storage.most_active(self.channel_activity.items(), window, now)
+        result = "Самые активные пользователи:\n"
+        result += "".join(f"<@{user_id}>: {count}\n" for user_id, count in users) or "никого\n"
+        result += "Самые активные каналы:\n"
+        result += "".join(f"<#{channel_id}>: {count}\n" for channel_id, count in channels) or "ни одного\n"
+        return result
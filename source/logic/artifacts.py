@@ -4,6 +4,19 @@
 from __future__ import annotations
 from typing import Any, cast
 
+# Regular expressions for reading recognized text
+import re
+
+# Roll table search dependencies
+import bisect
+import csv
+import functools
+import io
+import itertools
+import json
+import numpy as np
+import numpy.typing as npt
+
 # Rate logic imports
 # from Levenshtein import distance as lev_dist
 
@@ -18,54 +31,407 @@ def load_data(item: str) -> Any:
 # load substat values
 substats = cast(dict[str, Any], load_data("substats"))
 
+# maximum artifact level and number of rolls a single substat can get
+MAX_LEVEL: int = 20
+MAX_ROLLS: int = 1 + MAX_LEVEL // 4
+
+def max_rolls(level: int) -> int:
+    """ Maximum number of rolls of a single substat on 'level' artifact."""
+    return 1 + min(max(level, 0), MAX_LEVEL) // 4
+
+def tolerance(mode: str, rolls: int) -> float:
+    """ Maximum difference between displayed value and sum of 'rolls' tiers.
+
+    Displayed values are rounded to 0.1 for percent and to 1 for flat stats,
+    tier values in 'substats.json' are rounded to 0.01.
+    """
+    return (0.05 if mode == "percent" else 0.5) + rolls * 0.005
+
+class RollTable():
+    """ Every reachable roll sum of a single substat.
+
+    Built once per substat and mode, then every value is solved with
+    a binary search instead of enumerating roll sequences.
+    """
+
+    def __init__(self, tiers: list[float], rolls: int = MAX_ROLLS):
+        """ Roll table initializer.
+
+        Keyword arguments:
+        tiers -- Values of single roll tiers, lowest first.
+        rolls -- Maximum number of rolls.
+        """
+        self.tiers: list[float] = tiers
+        # sums[n] are sorted (sum, tier counts) pairs of exactly n rolls
+        self.sums: list[list[tuple[float, tuple[int, ...]]]] = [[]]
+        for n in range(1, rolls + 1):
+            options: list[tuple[float, tuple[int, ...]]] = []
+            for combination in itertools.combinations_with_replacement(range(len(tiers)), n):
+                counts = tuple(combination.count(i) for i in range(len(tiers)))
+                options.append((sum(tiers[i] for i in combination), counts))
+            options.sort()
+            self.sums.append(options)
+        self.keys: list[list[float]] = [[_[0] for _ in options] for options in self.sums]
+
+    def solve(self, value: float, mode: str, rolls: int = MAX_ROLLS) -> list[tuple[int, tuple[int, ...]]]:
+        """ Every (number of rolls, tier counts) pair giving displayed 'value'."""
+        result: list[tuple[int, tuple[int, ...]]] = []
+        for n in range(1, min(rolls, len(self.sums) - 1) + 1):
+            eps = tolerance(mode, n)
+            low = bisect.bisect_left(self.keys[n], value - eps)
+            high = bisect.bisect_right(self.keys[n], value + eps)
+            result += [(n, counts) for _, counts in self.sums[n][low:high]]
+        return result
+
+# roll tables for every substat and mode
+tables: dict[tuple[str, str], RollTable] = {
+    (name, mode): RollTable(tiers)
+    for name, modes in substats.items()
+    for mode, tiers in modes.items()
+}
+
+def solve_substat(
+        name: str,
+        mode: str,
+        value: float,
+        level: int = MAX_LEVEL) -> list[tuple[int, tuple[int, ...]]]:
+    """ Possible (number of rolls, tier counts) of substat on 'level' artifact."""
+    return tables[(name, mode)].solve(value, mode, max_rolls(level))
+
+def total_rolls(level: int, count: int) -> set[int]:
+    """ Possible total number of substat rolls on artifact with 'count' substats."""
+    upgrades = min(max(level, 0), MAX_LEVEL) // 4
+    if count < 4:
+        # three starting substats, the fourth was not unlocked yet
+        return {3 + upgrades}
+    if upgrades == 0:
+        return {4}
+    # either four starting substats or the fourth one unlocked by first upgrade
+    return {4 + upgrades, 3 + upgrades}
+
+def count_rolls(level: int, art_stats: list[tuple[str, str, float]]) -> (list[int] | None):
+    """ Number of rolls of every substat consistent with artifact 'level'.
+
+    Prefers combinations matching total number of rolls on 'level',
+    returns None if some substat value is unreachable.
+    """
+    options: list[list[int]] = []
+    for stat_name, mode, stat_value in art_stats:
+        rolls = sorted({n for n, _ in solve_substat(stat_name, mode, stat_value, level)})
+        if len(rolls) == 0:
+            return None
+        options.append(rolls)
+    totals = total_rolls(level, len(art_stats))
+    for combination in itertools.product(*options):
+        if sum(combination) in totals:
+            return list(combination)
+    return [rolls[0] for rolls in options]
+
 def printable(procs: dict[str, int]) -> str:
     """ Set procs in printable format."""
     result = ""
-    print(procs)
     for k, v in procs.items():
         result += f"{k}: {v} прок(ов)\n"
     return result
 
-eps: float = 0.05
-def evaluate_procs(
-        value: float,
-        options: list[float],
-        depth: int,
-        procs: dict[float, int],
-        result: int) -> None:
-    """ Recoursivly get number of procs of given stat."""
-
-    if depth > 9: return
-    if value + eps >= 0 >= value - eps:
-        # result.add(frozenset(procs.items()))
-        result = sum(procs.values())
-    for proc in options:
-        procs[proc] += 1
-        evaluate_procs(value - proc, options, depth + 1, procs, result)
-        procs[proc] -= 1
-
 def parse_artifact_info(
         art_level: int,
         art_stats: list[tuple[str, str, float]]) -> str:
     """ Parse artifact with known artifact level and stats.
 
-    Currently supports only 20 lvl with 4 stats.
+    Procs are upgrades that landed on a substat, i.e. its rolls except the first one.
     """
-    if art_level != 20 and len(art_stats) != 4: return ""
+    if len(art_stats) == 0 or len(art_stats) > 4: return ""
+    if any((stat_name, mode) not in tables for stat_name, mode, _ in art_stats): return ""
 
-    total_procs: dict[str, int] = {}
-    for stat_name, mode, stat_value in art_stats:
-        # evaluate number of procs in given stat
-        procs: dict[float, int] = dict(zip(substats[stat_name][mode], [0] * 4))
-        result: int = 0
-        evaluate_procs(stat_value, substats[stat_name][mode], 0, procs, result)
-        total_procs[stat_name] = result
+    rolls = count_rolls(art_level, art_stats)
+    if rolls is None: return ""
+    total_procs: dict[str, int] = {
+        stat_name: n - 1 for (stat_name, _, _), n in zip(art_stats, rolls)
+    }
     debug_output(printable(total_procs), 1)
     return printable(total_procs)
 
 
+# "+20" artifact level line and "Крит. урон+7,8%" substat line
+level_pattern = re.compile(r"^\W*\+\s*(\d{1,2})\s*$")
+substat_pattern = re.compile(r"^\W*([^\W\d][^+\d]*?)\s*\+\s*(\d+(?:[.,]\d+)?)\s*(%?)")
+
+def extract_substats(text: str) -> tuple[int, list[tuple[str, str, float]]]:
+    """ Read artifact level and substats from recognized text.
+
+    Unknown stat names are skipped, level is 0 if not found.
+    """
+    level = 0
+    stats: list[tuple[str, str, float]] = []
+    # longer names first, so "шанс крит. попадания" is not read as shorter one
+    names = sorted(substats.keys(), key=len, reverse=True)
+    for line in text.lower().splitlines():
+        level_match = level_pattern.match(line)
+        if level_match is not None:
+            level = int(level_match.group(1))
+            continue
+        stat_match = substat_pattern.match(line)
+        if stat_match is None:
+            continue
+        name = next((_ for _ in names if _ in stat_match.group(1)), None)
+        mode = "percent" if stat_match.group(3) == "%" else "flat"
+        if name is None or mode not in substats[name]:
+            continue
+        stats.append((name, mode, float(stat_match.group(2).replace(",", "."))))
+    return level, stats
+
+# bump whenever 'parse_artifact' answers change, cached answers of older versions are dropped
+PARSER_VERSION: int = 1
+
 def parse_artifact(text: str) -> str:
     """ Parse artifact and give its rating with given text bulk."""
-    # stub...
-    # parse_artifact_info(..., ...)
-    return ""
+    level, stats = extract_substats(text)
+    if len(stats) == 0:
+        return ""
+    return parse_artifact_info(level, stats)
+
+
+### Batch artifact rating.
+#
+# Whole inventories are rated at once: every substat of every artifact
+# is looked up in roll tables with vectorised binary searches.
+
+# Genshin Open Object Description (GOOD) substat keys
+GOOD_KEYS: dict[str, tuple[str, str]] = {
+    "hp": ("нр", "flat"),
+    "hp_": ("нр", "percent"),
+    "atk": ("сила атаки", "flat"),
+    "atk_": ("сила атаки", "percent"),
+    "def": ("защита", "flat"),
+    "def_": ("защита", "percent"),
+    "eleMas": ("мастерство стихий", "flat"),
+    "enerRech_": ("восст. энергии", "percent"),
+    "critRate_": ("шанс крит. попадания", "percent"),
+    "critDMG_": ("крит. урон", "percent"),
+}
+
+# crit value weights: 2 * crit rate + crit damage
+CRIT_WEIGHTS: dict[tuple[str, str], float] = {
+    ("шанс крит. попадания", "percent"): 2,
+    ("крит. урон", "percent"): 1,
+}
+
+class Artifact():
+    """ Artifact with known level and substats."""
+
+    def __init__(self, label: str, level: int, art_stats: list[tuple[str, str, float]]):
+        """ Artifact initializer."""
+        self.label: str = label
+        self.level: int = level
+        self.stats: list[tuple[str, str, float]] = art_stats
+
+class BatchRating():
+    """ Rating of every artifact in a batch.
+
+    rolls -- Number of rolls of every substat in input order, 0 if unreachable.
+    roll_value -- Sum of substat values relative to maximum roll tier, 1.0 per ideal roll.
+    crit_value -- Two crit rates plus crit damage.
+    valid -- Every substat of artifact is reachable on its level.
+    """
+
+    def __init__(
+            self,
+            rolls: npt.NDArray[np.int64],
+            roll_value: npt.NDArray[np.float64],
+            crit_value: npt.NDArray[np.float64],
+            valid: npt.NDArray[np.bool_]):
+        """ Batch rating initializer."""
+        self.rolls: npt.NDArray[np.int64] = rolls
+        self.roll_value: npt.NDArray[np.float64] = roll_value
+        self.crit_value: npt.NDArray[np.float64] = crit_value
+        self.valid: npt.NDArray[np.bool_] = valid
+
+# roll tables as arrays: sorted sums of exactly n rolls for every substat key
+table_keys: list[tuple[str, str]] = list(tables.keys())
+table_sums: list[list[npt.NDArray[np.float64]]] = [
+    [np.array(keys, dtype=np.float64) for keys in tables[key].keys] for key in table_keys]
+max_tiers: npt.NDArray[np.float64] = np.array(
+    [tables[key].tiers[-1] for key in table_keys], dtype=np.float64)
+crit_weights: npt.NDArray[np.float64] = np.array(
+    [CRIT_WEIGHTS.get(key, 0) for key in table_keys], dtype=np.float64)
+
+def rate_batch(artifacts: list[Artifact]) -> BatchRating:
+    """ Solve every substat of every artifact at once.
+
+    Every substat gets the fewest rolls reaching its value on artifact level.
+    Unknown substats must be filtered out beforehand.
+    """
+    index = {key: i for i, key in enumerate(table_keys)}
+    owner = np.array([i for i, art in enumerate(artifacts) for _ in art.stats], dtype=np.int64)
+    key = np.array(
+        [index[(name, mode)] for art in artifacts for name, mode, _ in art.stats], dtype=np.int64)
+    value = np.array([v for art in artifacts for _, _, v in art.stats], dtype=np.float64)
+    levels = np.array([art.level for art in artifacts], dtype=np.int64)
+    limit = 1 + np.clip(levels, 0, MAX_LEVEL)[owner] // 4
+
+    rolls = np.zeros(len(value), dtype=np.int64)
+    for k in np.unique(key):
+        mask = key == k
+        values, limits = value[mask], limit[mask]
+        found = np.zeros(len(values), dtype=np.int64)
+        # fewer rolls are checked last and overwrite more rolls
+        for n in range(MAX_ROLLS, 0, -1):
+            eps = tolerance(table_keys[k][1], n)
+            sums = table_sums[k][n]
+            hit = np.searchsorted(sums, values + eps, side="right") > \
+                np.searchsorted(sums, values - eps, side="left")
+            found[hit & (n <= limits)] = n
+        rolls[mask] = found
+
+    count = len(artifacts)
+    return BatchRating(
+        rolls,
+        np.bincount(owner, weights=value / max_tiers[key], minlength=count).astype(np.float64),
+        np.bincount(owner, weights=value * crit_weights[key], minlength=count).astype(np.float64),
+        np.bincount(owner, weights=rolls == 0, minlength=count) == 0)
+
+def good_artifact(i: int, item: dict[str, Any]) -> Artifact:
+    """ Artifact from GOOD format object."""
+    art_stats = [
+        GOOD_KEYS[_["key"]] + (float(_["value"]),)
+        for _ in item.get("substats", []) if _.get("key") in GOOD_KEYS]
+    label = f"{item.get('setKey', '')} {item.get('slotKey', '')}".strip() or f"#{i + 1}"
+    return Artifact(label, int(item.get("level", 0)), art_stats)
+
+def load_inventory(data: bytes, filename: str) -> list[Artifact]:
+    """ Read artifacts from exported inventory file.
+
+    Supported formats:
+    JSON in GOOD format {"artifacts": [{"level": 20, "substats": [{"key": "critDMG_", "value": 7.8}]}]},
+    JSON list [{"level": 20, "substats": [["крит. урон", "percent", 7.8], ...]}, ...],
+    CSV with "id,level,stat,mode,value" columns and a row per substat.
+    Unknown substats are skipped.
+    """
+    text = data.decode("utf-8-sig")
+    artifacts: list[Artifact] = []
+    if filename.lower().endswith(".csv"):
+        rows: dict[str, Artifact] = {}
+        for row in csv.DictReader(io.StringIO(text)):
+            art = rows.setdefault(row["id"], Artifact(row["id"], int(row["level"]), []))
+            if (row["stat"].lower(), row["mode"]) in tables:
+                art.stats.append((row["stat"].lower(), row["mode"], float(row["value"])))
+        artifacts = list(rows.values())
+    else:
+        content = json.loads(text)
+        if isinstance(content, dict):
+            artifacts = [good_artifact(i, _) for i, _ in enumerate(content.get("artifacts", []))]
+        else:
+            for i, item in enumerate(content):
+                art_stats = [
+                    (str(name).lower(), str(mode), float(value))
+                    for name, mode, value in item.get("substats", [])
+                    if (str(name).lower(), str(mode)) in tables]
+                artifacts.append(Artifact(str(item.get("name", f"#{i + 1}")), int(item.get("level", 0)), art_stats))
+    return [_ for _ in artifacts if 0 < len(_.stats) <= 4]
+
+def rate_inventory(artifacts: list[Artifact], sort: str = "rv", count: int = 15) -> str:
+    """ Ranked summary of best artifacts in inventory by roll value or crit value."""
+    if len(artifacts) == 0:
+        return ""
+    rating = rate_batch(artifacts)
+    score = rating.crit_value if sort == "cv" else rating.roll_value
+    order = np.argsort(-np.where(rating.valid, score, -1.0), kind="stable")
+
+    result = f"Артефактов: {len(artifacts)}, не распознано: {int((~rating.valid).sum())}\n"
+    for place, i in enumerate(order[:count], start=1):
+        if not rating.valid[i]:
+            break
+        art = artifacts[i]
+        result += (
+            f"{place}. {art.label} +{art.level}: "
+            f"RV {rating.roll_value[i] * 100:.0f}%, CV {rating.crit_value[i]:.1f}\n")
+    return result
+
+
+### Upgrade potential.
+#
+# Every upgrade of a 4 substat artifact picks one of the substats uniformly
+# and adds one of 4 tiers uniformly. Tiers are 7, 8, 9 and 10 tenths of
+# the highest tier, so exact distributions of gained roll value are
+# convolutions of a single upgrade distribution on a grid of tenths.
+
+# substats counted in roll value score
+FOCUS: dict[str, set[tuple[str, str]]] = {
+    "crit": {("шанс крит. попадания", "percent"), ("крит. урон", "percent")},
+    "atk": {("шанс крит. попадания", "percent"), ("крит. урон", "percent"), ("сила атаки", "percent")},
+    "hp": {("шанс крит. попадания", "percent"), ("крит. урон", "percent"), ("нр", "percent")},
+    "def": {("шанс крит. попадания", "percent"), ("крит. урон", "percent"), ("защита", "percent")},
+    "em": {("мастерство стихий", "flat"), ("восст. энергии", "percent")},
+}
+
+# tier values in tenths of the highest tier
+TIER_TENTHS: list[int] = [7, 8, 9, 10]
+
+def default_mode(name: str) -> str:
+    """ Percent mode of substat if it has one, flat otherwise."""
+    return "percent" if "percent" in substats.get(name, {}) else "flat"
+
+def remaining_upgrades(level: int) -> int:
+    """ Number of upgrades left before maximum level."""
+    return MAX_LEVEL // 4 - min(max(level, 0), MAX_LEVEL) // 4
+
+@functools.lru_cache(maxsize=64)
+def upgrade_distribution(upgrades: int, wanted: int) -> npt.NDArray[np.float64]:
+    """ Probabilities of gaining 'i' tenths of ideal roll in 'upgrades' upgrades.
+
+    'wanted' of 4 substats count in the score. Result is cached and read-only.
+    """
+    step = np.zeros(TIER_TENTHS[-1] + 1, dtype=np.float64)
+    step[0] = 1 - wanted / 4
+    step[TIER_TENTHS] += wanted / 4 / len(TIER_TENTHS)
+    result = np.ones(1, dtype=np.float64)
+    for _ in range(upgrades):
+        result = np.convolve(result, step)
+    result.setflags(write=False)
+    return result
+
+def upgrade_potential(
+        art_level: int,
+        art_stats: list[tuple[str, str, float]],
+        focus: str = "crit",
+        target: (float | None) = None) -> str:
+    """ Distribution of final roll value of artifact upgraded to maximum level.
+
+    Roll value is a sum of 'focus' substats relative to the highest tier, in percent.
+    Supports artifacts with 4 substats.
+    """
+    if len(art_stats) != 4: return ""
+    if any((stat_name, mode) not in tables for stat_name, mode, _ in art_stats): return ""
+    wanted_keys = FOCUS.get(focus, FOCUS["crit"])
+    wanted = [(name, mode) in wanted_keys for name, mode, _ in art_stats]
+    upgrades = remaining_upgrades(art_level)
+
+    # current and final score in tenths of ideal roll
+    current = sum(
+        value / tables[(name, mode)].tiers[-1]
+        for (name, mode, value), is_wanted in zip(art_stats, wanted) if is_wanted) * 10
+    gained = upgrade_distribution(upgrades, sum(wanted))
+    cumulative = np.cumsum(gained)
+    def percentile(q: float) -> float:
+        """ Final roll value in percent reached with probability 1 - 'q'."""
+        return (current + int(np.searchsorted(cumulative, q))) * 10
+
+    result = (
+        f"Улучшений осталось: {upgrades}\n"
+        f"RV сейчас: {current * 10:.0f}%\n"
+        f"RV на +{MAX_LEVEL}: в среднем {(current + gained @ np.arange(len(gained))) * 10:.0f}%, "
+        f"медиана {percentile(0.5):.0f}%, 10% лучших от {percentile(0.9):.0f}%\n")
+    if target is not None:
+        # gained tenths needed to reach target percent
+        needed = int(np.ceil(target / 10 - current - 1e-9))
+        chance = float(gained[max(needed, 0):].sum())
+        result += f"Шанс получить RV от {target:.0f}%: {chance * 100:.1f}%\n"
+
+    # expected final value of every substat
+    single = upgrade_distribution(upgrades, 1)
+    expected_tenths = float(single @ np.arange(len(single)))
+    for name, mode, value in art_stats:
+        final = value + expected_tenths / 10 * tables[(name, mode)].tiers[-1]
+        result += f"{name}: {value:g} -> ~{final:.1f}\n"
+    return result
@@ -1,6 +1,6 @@
 """ Spunya entry point module.
 
-NOTE: to run bot setup "token" and "guild" in "config.json".
+NOTE: to run bot setup "token" and "guilds" in "config.json".
 """
 
 # Type annotation imports
@@ -14,12 +14,15 @@ from sys import exit as sys_exit
 import discord
 
 # Debug output logger
-from utils.logger import set_debug_level, debug_output
+from utils.logger import setup_logging, debug_output
 from utils.json_loader import load_json
 
 # Spunya bot dependencies
 from spunya import Spunya
+from guild_stats import GuildConfig
 from tree import load_command_tree
+from storage import set_tokenizer
+from utils.tokenizer import Tokenizer
 
 ### Main program entry
 if __name__ == "__main__":
@@ -28,8 +31,32 @@ if __name__ == "__main__":
         config: dict[str, Any] = cast(dict[str, Any], load_json("config.json"))
         token: str = config["token"]
         prefix: str = config["prefix"]
-        guild: int = int(config["guild_id"])
-        ignored: list[int] = config["ignored"]
+        guilds: dict[int, GuildConfig] = GuildConfig.from_config(config)
+        database_path: str = config.get("database", "stats.db")
+        save_interval: int = int(config.get("save_interval", 300))
+        backfill_concurrency: int = int(config.get("backfill_concurrency", 4))
+        backfill_days: float = float(config.get("backfill_days", 30))
+        bot_cps: int = int(config.get("bot_cps", 300))
+        ocr_workers: int = int(config.get("ocr_workers", 2))
+        ocr_queue_depth: int = int(config.get("ocr_queue_depth", 8))
+        ocr_cache_size: int = int(config.get("ocr_cache_size", 256))
+        ocr_cache_path: (str | None) = config.get("ocr_cache")
+        ocr_backend: str = config.get("ocr_backend", "tesserocr")
+        ocr_crop: bool = bool(config.get("ocr_crop", True))
+        ocr_similar: bool = bool(config.get("ocr_similar", False))
+        tokenizer: Tokenizer = Tokenizer(**config.get("tokenizer", {}))
+        chunk_guilds: bool = bool(config.get("chunk_guilds", False))
+        message_cache_size: int = int(config.get("message_cache_size", 50000))
+        shard_count: (int | None) = config.get("shard_count")
+        stats_worker: bool = bool(config.get("stats_worker", False))
+        metrics_port: (int | None) = config.get("metrics_port")
+        metrics_host: str = config.get("metrics_host", "127.0.0.1")
+        profile_dir: str = config.get("profile_dir", "profiles")
+        profile_duration: float = float(config.get("profile_duration", 30))
+        debug_level: int = int(config.get("debug_level", 2))
+        log_file: (str | None) = config.get("log_file")
+        log_max_bytes: int = int(config.get("log_max_bytes", 10 * 1024 * 1024))
+        log_backups: int = int(config.get("log_backups", 5))
         # TODO: extend .json info
     except KeyError:
         debug_output("'config.json' file is not setuped properly!", 0)
@@ -37,18 +64,42 @@ if __name__ == "__main__":
     except TypeError:
         debug_output("Guild ID is not a proper value!", 0)
         sys_exit(-1)
-    if token is None or prefix is None or guild is None:
+    if token is None or prefix is None or len(guilds) == 0:
         debug_output("'config.json' file is not setuped properly", 0)
         sys_exit(-1)
 
-    # set debug ouput level
-    set_debug_level(2)
+    # set debug ouput level and start writing logs off the event loop
+    setup_logging(debug_level, log_file, log_max_bytes, log_backups)
+
+    # set message words normalisation
+    set_tokenizer(tokenizer)
 
     # wake up spunya and bind command tree
-    spunya: Spunya = Spunya(guild, prefix, discord.Intents.all())
+    spunya: Spunya = Spunya(
+        guilds, prefix, discord.Intents.all(),
+        database_path = database_path,
+        save_interval = save_interval,
+        backfill_concurrency = backfill_concurrency,
+        backfill_days = backfill_days,
+        bot_cps = bot_cps,
+        ocr_workers = ocr_workers,
+        ocr_queue_depth = ocr_queue_depth,
+        ocr_cache_size = ocr_cache_size,
+        ocr_cache_path = ocr_cache_path,
+        ocr_backend = ocr_backend,
+        ocr_crop = ocr_crop,
+        ocr_similar = ocr_similar,
+        chunk_guilds = chunk_guilds,
+        message_cache_size = message_cache_size,
+        shard_count = shard_count,
+        stats_worker = stats_worker,
+        metrics_port = metrics_port,
+        metrics_host = metrics_host,
+        profile_dir = profile_dir,
+        profile_duration = profile_duration)
 
     # initialize and append command tree from 'tree.py'
-    load_command_tree(spunya, guild)
+    load_command_tree(spunya, list(guilds))
 
     # run Spunya callback loop
     spunya.run(token)
@@ -0,0 +1,118 @@
+""" Message fast-path filter module.
+
+Decides whether a message is answered and counted before any string work.
+Ignored channels, roles and users of every served guild are kept in frozen
+id sets, verdicts about members are cached until their roles change.
+"""
+
+# Type annotation imports
+from __future__ import annotations
+
+# Discord.py API dependencies
+import discord
+
+# Spunya dependencies
+from guild_stats import GuildConfig
+
+class GuildRules():
+    """ Ignored ids of a single guild."""
+
+    __slots__ = ("channels", "roles", "users", "bots")
+
+    def __init__(self, config: GuildConfig):
+        """ Compile rules from guild configuration."""
+        self.channels: frozenset[int] = config.ignored
+        self.roles: frozenset[int] = config.ignored_roles
+        self.users: frozenset[int] = config.ignored_users
+        self.bots: bool = config.ignore_bots
+
+class MessageFilter():
+    """ O(1) message acceptance check of served guilds."""
+
+    def __init__(self, guilds: dict[int, GuildConfig], capacity: int = 100000):
+        """ Message filter initializer.
+
+        Keyword arguments:
+        capacity -- Maximum number of cached verdicts, the oldest are dropped first.
+        """
+        self.rules: dict[int, GuildRules] = {_: GuildRules(config) for _, config in guilds.items()}
+        self.capacity: int = capacity
+        # verdicts of members by (guild id, user id), oldest first
+        self.verdicts: dict[tuple[int, int], bool] = {}
+        self.self_id: (int | None) = None
+
+    def accepts(self, message: discord.Message) -> bool:
+        """ Whether message of served guild should be answered and counted."""
+        guild = message.guild
+        rules = None if guild is None else self.rules.get(guild.id)
+        if guild is None or rules is None:
+            return False
+        if not self.accepts_channel(guild.id, message.channel.id):
+            return False
+        # threads follow their parent channel
+        parent_id = getattr(message.channel, "parent_id", None)
+        if parent_id is not None and parent_id in rules.channels:
+            return False
+        if message.webhook_id is not None and rules.bots:
+            return False
+        return self.accepts_author(guild, message.author)
+
+    def accepts_channel(self, guild_id: int, channel_id: int) -> bool:
+        """ Whether channel of served guild is not ignored."""
+        rules = self.rules.get(guild_id)
+        return rules is not None and channel_id not in rules.channels
+
+    def accepts_author(self, guild: discord.Guild, author: (discord.User | discord.Member)) -> bool:
+        """ Whether messages of author are answered and counted.
+
+        Verdicts are cached for members only. History authors missing in the
+        member cache are plain users with unknown roles, they are judged
+        without caching until their member is known.
+        """
+        key = (guild.id, author.id)
+        verdict = self.verdicts.get(key)
+        if verdict is not None:
+            return verdict
+        if not isinstance(author, discord.Member):
+            member = guild.get_member(author.id)
+            if member is None:
+                return self.judge(self.rules[guild.id], author)
+            author = member
+        verdict = self.judge(self.rules[guild.id], author)
+        if len(self.verdicts) >= self.capacity:
+            del self.verdicts[next(iter(self.verdicts))]
+        self.verdicts[key] = verdict
+        return verdict
+
+    def judge(self, rules: GuildRules, author: (discord.User | discord.Member)) -> bool:
+        """ Check author against guild rules."""
+        if author.id == self.self_id or author.id in rules.users:
+            return False
+        if rules.bots and author.bot:
+            return False
+        # users who left the guild have no roles
+        roles = getattr(author, "roles", ())
+        return not any(_.id in rules.roles for _ in roles)
+
+    ### Cache invalidation
+
+    def forget_member(self, guild_id: int, user_id: int) -> None:
+        """ Drop cached verdict of member whose roles changed or who left."""
+        self.verdicts.pop((guild_id, user_id), None)
+
+    def forget_role(self, role: discord.Role) -> None:
+        """ Deleted role no longer ignores anybody."""
+        rules = self.rules.get(role.guild.id)
+        if rules is not None and role.id in rules.roles:
+            rules.roles = rules.roles - {role.id}
+            self.forget_guild(role.guild.id)
+
+    def forget_channel(self, channel: discord.abc.GuildChannel) -> None:
+        """ Deleted channel id is not kept in ignored set."""
+        rules = self.rules.get(channel.guild.id)
+        if rules is not None and channel.id in rules.channels:
+            rules.channels = rules.channels - {channel.id}
+
+    def forget_guild(self, guild_id: int) -> None:
+        """ Drop every cached verdict of guild."""
+        self.verdicts = {key: _ for key, _ in self.verdicts.items() if key[0] != guild_id}
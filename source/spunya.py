@@ -5,13 +5,24 @@ Connects Discord API to distinct callback modules.
 
 # Type annotation imports
 from __future__ import annotations
+from typing import Any, Callable, Coroutine
+import asyncio
 import datetime
+import signal
+import time
 
 # Discord.py API dependencies
 import discord
 
 # Debug output logger
 from utils.logger import debug_output
+from utils.metrics import Metrics
+from utils.profiler import SamplingProfiler
+from utils.reply_scheduler import ReplyScheduler
+from utils.triggers import Communication
+from utils.image_loader import OcrPipeline
+from utils.ocr_cache import OcrCache
+from logic.artifacts import PARSER_VERSION
 
 # Spunya dependencies
 import callbacks.channel
@@ -19,41 +30,176 @@ import callbacks.message
 import callbacks.reaction
 import callbacks.role
 import callbacks.member
+import callbacks.voice
+import backfill
+import database
 import storage
+from guild_stats import GuildConfig
+from message_filter import MessageFilter
+from stats_backend import StatsBackend, LocalBackend, RemoteBackend
+from stats_store import StatsStore
 
-class Spunya(discord.Client):
+class Spunya(discord.AutoShardedClient):
     """ Represents 'Spunya' bot that connects to Discord.
 
     This class is used to interact with the Discord WebSocket and API.
+    Statistics are partitioned by served guild.
     """
 
     def __init__(
             self,
-            working_guild: int,
+            guilds: dict[int, GuildConfig],
             prefix: str,
             intents: discord.Intents,
-            ignored_guilds: list[int] = []):
-        """ Spunya initializer."""
-        super().__init__(command_prefix=prefix, intents=intents)
-        self.working_guild: int = working_guild
-        self.stats: dict[int, storage.UserStats] = {}
-        self.words: set[str] = set()
-        self.ignored_guilds: list[int] = ignored_guilds
+            database_path: str = "stats.db",
+            save_interval: int = 300,
+            backfill_concurrency: int = 4,
+            backfill_days: float = 30,
+            bot_cps: int = 300,
+            ocr_workers: int = 2,
+            ocr_queue_depth: int = 8,
+            ocr_cache_size: int = 256,
+            ocr_cache_path: (str | None) = None,
+            ocr_backend: str = "tesserocr",
+            ocr_crop: bool = True,
+            ocr_similar: bool = False,
+            chunk_guilds: bool = False,
+            message_cache_size: int = 50000,
+            shard_count: (int | None) = None,
+            stats_worker: bool = False,
+            metrics_port: (int | None) = None,
+            metrics_host: str = "127.0.0.1",
+            profile_dir: str = "profiles",
+            profile_duration: float = 30):
+        """ Spunya initializer.
+
+        Guild members are not chunked at startup unless 'chunk_guilds' is set,
+        statistics are created on first activity and keyed by user id.
+        Number of shards is requested from Discord unless 'shard_count' is set.
+        Never parsed channels are crawled 'backfill_days' back at most.
+        Statistics are aggregated in a separate process if 'stats_worker' is set.
+        Metrics are served over HTTP on 'metrics_host' if 'metrics_port' is set.
+        SIGUSR1 toggles a 'profile_duration' seconds profile written to 'profile_dir'.
+        """
+        super().__init__(
+            command_prefix=prefix, intents=intents, chunk_guilds_at_startup=chunk_guilds,
+            shard_count=shard_count)
+        self.guild_configs: dict[int, GuildConfig] = guilds
+        self.message_filter: MessageFilter = MessageFilter(guilds)
         self.tree: discord.app_commands.CommandTree[discord.Client]
 
+        # persistent statistics of served guilds
+        # rows stored before multi-guild support belong to the first configured guild
+        store = StatsStore(guilds, message_cache_size)
+        legacy_guild = next(iter(guilds), 0)
+        self.stats: StatsBackend
+        if stats_worker:
+            self.stats = RemoteBackend(store, database_path, legacy_guild)
+        else:
+            self.stats = LocalBackend(store, database.StatsDatabase(database_path, legacy_guild))
+        self.save_interval: int = save_interval
+        self.autosave_task: (asyncio.Task[None] | None) = None
+        self.backfill_concurrency: int = backfill_concurrency
+        self.backfill_days: float = backfill_days
+        # channel marks and crawl end taken before live messages arrive
+        self.backfill_marks: dict[int, dict[int, int]] = {}
+        # crawl end of guilds being backfilled and their latest live message ids
+        self.backfill_bounds: dict[int, int] = {}
+        self.live_marks: dict[int, dict[int, int]] = {}
+
+        # delayed chat replies and their triggers
+        self.replies: ReplyScheduler = ReplyScheduler(bot_cps)
+        self.communication: Communication = Communication()
+
+        # handler latency and event loop lag metrics
+        self.metrics: Metrics = Metrics()
+        self.metrics_port: (int | None) = metrics_port
+        self.metrics_host: str = metrics_host
+        self.metrics_task: (asyncio.Task[None] | None) = None
+        self.metrics_server: (asyncio.AbstractServer | None) = None
+
+        # opt-in event loop sampling profiler
+        self.profiler: SamplingProfiler = SamplingProfiler(profile_dir)
+        self.profile_duration: float = profile_duration
+
+        # artifact image recognition
+        # cached answers depend on OCR engine, preprocessing and parser
+        ocr_version = f"{PARSER_VERSION}:{ocr_backend}:{'crop' if ocr_crop else 'full'}"
+        self.ocr: OcrPipeline = OcrPipeline(
+            ocr_workers, ocr_queue_depth,
+            OcrCache(ocr_cache_size, ocr_cache_path, ocr_similar, version = ocr_version),
+            ocr_backend, ocr_crop)
+
+    async def setup_hook(self) -> None:
+        """ Called once after login, before connecting to the WebSocket.
+
+        Channel marks are read here, before live messages can move them.
+        """
+        self.message_filter.self_id = self.application_id
+        await self.stats.start()
+        before = discord.utils.time_snowflake(discord.utils.utcnow())
+        for guild_id in self.guild_configs:
+            self.backfill_marks[guild_id] = await self.stats.query("marks", guild_id)
+            self.backfill_bounds[guild_id] = before
+        self.autosave_task = asyncio.create_task(self.autosave())
+        self.metrics_task = asyncio.create_task(self.metrics.monitor_loop())
+        if self.metrics_port is not None:
+            self.metrics_server = await self.metrics.serve(self.metrics_host, self.metrics_port)
+        # signal handlers run on the event loop thread, which is the one sampled
+        if hasattr(signal, "SIGUSR1"):
+            asyncio.get_running_loop().add_signal_handler(
+                signal.SIGUSR1, self.profiler.toggle, self.profile_duration)
+
+    async def close(self) -> None:
+        """ Stores collected statistics and closes the connection to Discord."""
+        if self.autosave_task is not None:
+            self.autosave_task.cancel()
+        if self.metrics_task is not None:
+            self.metrics_task.cancel()
+        if self.metrics_server is not None:
+            self.metrics_server.close()
+        self.profiler.stop()
+        # open voice sessions are reopened by reconciliation after restart
+        self.stats.publish("close_voice", time.time())
+        await self.save_stats()
+        await self.stats.close()
+        await self.ocr.shutdown()
+        await super().close()
+
     async def on_ready(self) -> None:
         """ Called when the client is done preparing the data received from Discord.
 
         Usually after login is successful and the Client.guilds and co. are filled up.
+        With several shards it is called once all of them are ready.
         """
-        await self.tree.sync(guild=discord.Object(id=self.working_guild))
-        debug_output("Connected to Discord!", 0)
+        for guild_id in self.guild_configs:
+            await self.tree.sync(guild=discord.Object(id=guild_id))
+        debug_output(f"Connected to Discord with {self.shard_count} shards!", 0)
         for guild in self.guilds:
             debug_output(f"Connected to {guild.name}[{guild.id}].", 1)
-            if guild.id == self.working_guild:
+            if self.serves(guild.id):
+                callbacks.voice.reconcile(self, guild)
                 await self.load_stats(guild)
         debug_output("All loaded..", 1)
 
+    async def _run_event(
+            self,
+            coro: Callable[..., Coroutine[Any, Any, Any]],
+            event_name: str,
+            *args: Any,
+            **kwargs: Any) -> None:
+        """ Runs a dispatched event handler, recording its latency and in-flight count."""
+        started = self.metrics.start(event_name)
+        try:
+            await super()._run_event(coro, event_name, *args, **kwargs)
+        finally:
+            self.metrics.finish(event_name, started)
+
+    async def on_error(self, event_method: str, /, *args: Any, **kwargs: Any) -> None:
+        """ Called when an event handler raises, the failure is counted and logged."""
+        self.metrics.fail(event_method)
+        await super().on_error(event_method, *args, **kwargs)
+
     ### Guild channels events.
     #
     # The following section represents Dicord channel events.
@@ -147,6 +293,27 @@ class Spunya(discord.Client):
         """
         await callbacks.message.on_delete(self, message)
 
+    async def on_raw_message_edit(self, payload: discord.RawMessageUpdateEvent) -> None:
+        """ Called when a message is edited.
+
+        Unlike on_message_edit(), this is called regardless of the state of the internal message cache.
+        """
+        await callbacks.message.on_raw_edit(self, payload)
+
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent) -> None:
+        """ Called when a message is deleted.
+
+        Unlike on_message_delete(), this is called regardless of the message being in the internal message cache or not.
+        """
+        await callbacks.message.on_raw_delete(self, payload)
+
+    async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent) -> None:
+        """ Called when a bulk delete is triggered.
+
+        This event is called regardless of the message IDs being in the internal message cache or not.
+        """
+        await callbacks.message.on_raw_bulk_delete(self, payload)
+
     ### Guild reaction events
 
     async def on_reaction_add(
@@ -266,32 +433,67 @@ class Spunya(discord.Client):
         * A member is muted or deafened by their own accord.
         * A member is muted or deafened by a guild administrator.
         """
+        await callbacks.voice.on_state_update(self, member, before, after)
 
     async def load_stats(self, guild: discord.Guild) -> None:
-        """ Loads previous messages and collects stats."""
-        # Get statistics for every guild member
-        for user in guild.members:
-            self.stats[user.id] = storage.UserStats(user)
-        # Get statistics for every text channel
-        for channel in guild.text_channels:
-            await self.parse_channel(channel)
-
-    async def parse_channel(self, channel: discord.TextChannel) -> None:
-        """ Extracts info from text channel."""
-        # skip channels marked as 'ignored'
-        if channel.id in self.ignored_guilds:
+        """ Loads previous messages and collects stats.
+
+        Reconnects only fetch messages newer than the channel marks. Live
+        messages do not move marks of the guild until its backfill is done.
+        """
+        # Get statistics for every text channel except ignored ones, several channels at once
+        channels = [_ for _ in guild.text_channels if self.message_filter.accepts_channel(guild.id, _.id)]
+        marks = self.backfill_marks.pop(guild.id, None)
+        if marks is None:
+            # reconnect, marks taken at startup are already used
+            self.backfill_bounds[guild.id] = discord.utils.time_snowflake(discord.utils.utcnow())
+            marks = await self.stats.query("marks", guild.id)
+        await backfill.Backfill(
+            self, guild.id, marks, self.backfill_concurrency, self.backfill_days,
+            self.backfill_bounds[guild.id]).run(channels)
+        # crawled history is contiguous with live messages now
+        del self.backfill_bounds[guild.id]
+        for channel_id, message_id in self.live_marks.pop(guild.id, {}).items():
+            self.stats.publish("parse", guild.id, channel_id, [], message_id)
+        await self.save_stats()
+
+    def serves(self, guild_id: (int | None)) -> bool:
+        """ Whether statistics of guild are collected."""
+        return guild_id in self.guild_configs
+
+    def parse_messages(self, guild_id: int, messages: list[discord.Message], live: bool = False) -> None:
+        """ Publishes a batch of messages of one channel to statistics.
+
+        Messages rejected by the message filter are skipped, the channel mark
+        still moves past them. Live messages of a guild being backfilled are
+        counted without moving the mark, messages older than the crawl end
+        are left to the crawl.
+        """
+        if len(messages) == 0:
             return
-        # get last 10000 messages in channel
-        messages = [message async for message in channel.history(limit=10000)]
-        debug_output(f"Loaded {len(messages)} from text channel {channel.name}[{channel.id}]", 1)
-        # load statistics
-        for m in messages:
-            if m.author.id in self.stats:
-                self.stats[m.author.id].parse_message(m)
-
-    def get_stats(self) -> str:
-        """ Transorms message statistics into printable form."""
-        result = ""
-        for el in reversed(sorted(list(self.stats.items()), key=lambda x: x[1].message_count)[-3:]):
-            result += str(el[1]) + "\n"
-        return result
+        channel_id = messages[0].channel.id
+        newest = max(_.id for _ in messages)
+        last_message_id: (int | None) = newest
+        bound = self.backfill_bounds.get(guild_id) if live else None
+        if bound is not None:
+            messages = [_ for _ in messages if _.id > bound]
+            live_marks = self.live_marks.setdefault(guild_id, {})
+            live_marks[channel_id] = max(newest, live_marks.get(channel_id, 0))
+            last_message_id = None
+        # webhooks have no user behind them
+        accepts = self.message_filter.accepts
+        events = [
+            storage.MessageEvent.from_message(_) for _ in messages
+            if _.webhook_id is None and accepts(_)]
+        self.stats.publish("parse", guild_id, channel_id, events, last_message_id)
+
+    async def save_stats(self) -> None:
+        """ Stores changed user statistics and channel marks of every guild."""
+        saved = await self.stats.save()
+        debug_output(f"Saved stats of {saved} users.", 2)
+
+    async def autosave(self) -> None:
+        """ Periodically stores collected statistics."""
+        while True:
+            await asyncio.sleep(self.save_interval)
+            await self.save_stats()
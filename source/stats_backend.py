@@ -0,0 +1,266 @@
+""" Statistics backends module.
+
+Bot code reaches statistics only through a backend: events are published
+without waiting, queries are awaited. The local backend runs the store on
+the event loop, the remote backend runs it in a worker process fed by a
+multiprocessing queue, so word counting never competes with the gateway.
+"""
+
+# Type annotation imports
+from __future__ import annotations
+from typing import Any
+import abc
+
+# Asynchronous, process and thread dependencies
+import asyncio
+import itertools
+import multiprocessing
+import threading
+
+# Debug output logger
+from utils.logger import set_debug_level, debug_level, debug_output
+from utils.tokenizer import Tokenizer
+
+# Spunya dependencies
+import database
+import storage
+from stats_store import EVENTS, QUERIES, StatsStore
+
+class StatsBackend(abc.ABC):
+    """ Base statistics backend."""
+
+    @abc.abstractmethod
+    async def start(self) -> None:
+        """ Load stored statistics."""
+
+    @abc.abstractmethod
+    def publish(self, name: str, *args: Any) -> None:
+        """ Send statistics changing event without waiting for it."""
+
+    @abc.abstractmethod
+    async def query(self, name: str, *args: Any) -> Any:
+        """ Read statistics, all previously published events are applied first."""
+
+    @abc.abstractmethod
+    async def save(self) -> int:
+        """ Store changed statistics, returns number of saved users."""
+
+    @abc.abstractmethod
+    async def close(self) -> None:
+        """ Release backend resources, statistics are not saved."""
+
+class LocalBackend(StatsBackend):
+    """ Statistics store running on the event loop."""
+
+    def __init__(self, store: StatsStore, stats_database: database.StatsDatabase):
+        """ Local backend initializer."""
+        self.store: StatsStore = store
+        self.database: database.StatsDatabase = stats_database
+
+    async def start(self) -> None:
+        """ Load stored statistics."""
+        loaded = self.store.restore(await self.database.load())
+        debug_output(f"Loaded stored stats of {loaded} users.", 1)
+
+    def publish(self, name: str, *args: Any) -> None:
+        """ Apply statistics changing event."""
+        if name not in EVENTS:
+            raise ValueError(f"Unknown stats event '{name}'")
+        getattr(self.store, name)(*args)
+
+    async def query(self, name: str, *args: Any) -> Any:
+        """ Read statistics."""
+        if name not in QUERIES:
+            raise ValueError(f"Unknown stats query '{name}'")
+        return getattr(self.store, name)(*args)
+
+    async def save(self) -> int:
+        """ Store changed statistics in database thread."""
+        changes = self.store.changes()
+        await self.database.save(changes)
+        return sum(len(_[1]) for _ in changes)
+
+    async def close(self) -> None:
+        """ Close database."""
+        await self.database.close()
+
+class RemoteBackend(StatsBackend):
+    """ Statistics store running in a separate worker process.
+
+    Events and queries share one request queue, so a query always sees the
+    effect of events published before it. Replies are read by a thread and
+    handed over to the event loop. Once the worker exits, awaited requests
+    fail and new ones are refused.
+    """
+
+    def __init__(
+            self,
+            store: StatsStore,
+            database_path: str,
+            legacy_guild: int = 0,
+            timeout: float = 60,
+            start_timeout: float = 600):
+        """ Remote backend initializer, worker is started by 'start'.
+
+        Keyword arguments:
+        store -- Empty store moved to worker process.
+        timeout -- Seconds to wait for a query reply.
+        start_timeout -- Seconds to wait for worker to load stored statistics.
+        """
+        # spawned worker does not inherit threads and sockets of the bot
+        context = multiprocessing.get_context("spawn")
+        self.requests: Any = context.Queue()
+        self.replies: Any = context.Queue()
+        self.process: Any = context.Process(
+            target=run_worker,
+            args=(self.requests, self.replies, store, database_path, legacy_guild,
+                  storage.tokenizer, debug_level()),
+            name="spunya-stats",
+            daemon=True)
+        self.timeout: float = timeout
+        self.start_timeout: float = start_timeout
+        self.alive: bool = False
+        self.stopping: bool = False
+        self.watcher: (asyncio.Task[None] | None) = None
+        self.ids: itertools.count[int] = itertools.count(1)
+        self.pending: dict[int, asyncio.Future[Any]] = {}
+        self.loop: (asyncio.AbstractEventLoop | None) = None
+        self.reader: threading.Thread = threading.Thread(
+            target=self.read_replies, name="spunya-stats-replies", daemon=True)
+
+    async def start(self) -> None:
+        """ Start worker process and wait until it loads stored statistics.
+
+        Raises RuntimeError if worker exits or does not load in time.
+        """
+        self.loop = asyncio.get_running_loop()
+        # worker answers request 0 once statistics are loaded
+        ready = self.pending[0] = self.loop.create_future()
+        self.process.start()
+        self.alive = True
+        self.reader.start()
+        self.watcher = asyncio.create_task(self.watch())
+        try:
+            loaded = await asyncio.wait_for(ready, self.start_timeout)
+        except asyncio.TimeoutError:
+            self.process.terminate()
+            raise RuntimeError(f"Stats worker did not load in {self.start_timeout} s") from None
+        finally:
+            self.pending.pop(0, None)
+        debug_output(f"Stats worker {self.process.pid} loaded stats of {loaded} users.", 1)
+
+    async def watch(self) -> None:
+        """ Wait for worker exit and fail every awaited request."""
+        assert self.loop is not None
+        await self.loop.run_in_executor(None, self.process.join)
+        self.alive = False
+        error = RuntimeError(f"Stats worker exited with code {self.process.exitcode}")
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(error)
+        if not self.stopping:
+            debug_output(str(error), 0)
+
+    def check_alive(self) -> None:
+        """ Raise RuntimeError if worker is not running."""
+        if not self.alive:
+            raise RuntimeError("Stats worker is not running")
+
+    def publish(self, name: str, *args: Any) -> None:
+        """ Queue statistics changing event."""
+        if name not in EVENTS:
+            raise ValueError(f"Unknown stats event '{name}'")
+        self.check_alive()
+        self.requests.put((None, name, args))
+
+    async def query(self, name: str, *args: Any) -> Any:
+        """ Send query to worker and wait for reply."""
+        if name not in QUERIES:
+            raise ValueError(f"Unknown stats query '{name}'")
+        return await self.request(name, *args)
+
+    async def request(self, name: str, *args: Any) -> Any:
+        """ Send request to worker and wait for reply."""
+        assert self.loop is not None
+        self.check_alive()
+        request_id = next(self.ids)
+        future = self.pending[request_id] = self.loop.create_future()
+        self.requests.put((request_id, name, args))
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        finally:
+            self.pending.pop(request_id, None)
+
+    async def save(self) -> int:
+        """ Make worker store changed statistics."""
+        return int(await self.request("save"))
+
+    async def close(self) -> None:
+        """ Stop worker process after it handles queued requests."""
+        if self.loop is None:
+            return
+        self.stopping = True
+        if self.alive:
+            self.requests.put((None, "stop", ()))
+        await self.loop.run_in_executor(None, self.process.join, self.timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+        if self.watcher is not None:
+            await self.watcher
+        self.replies.put(None)
+        self.requests.close()
+
+    def read_replies(self) -> None:
+        """ Hand over worker replies to event loop, runs in reader thread."""
+        assert self.loop is not None
+        while True:
+            reply = self.replies.get()
+            if reply is None:
+                return
+            self.loop.call_soon_threadsafe(self.resolve, *reply)
+
+    def resolve(self, request_id: int, result: Any, error: (str | None)) -> None:
+        """ Complete awaited request with worker reply."""
+        future = self.pending.get(request_id)
+        if future is None or future.done():
+            return
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(RuntimeError(f"Stats worker failed: {error}"))
+
+def run_worker(
+        requests: Any,
+        replies: Any,
+        store: StatsStore,
+        database_path: str,
+        legacy_guild: int,
+        tokenizer: Tokenizer,
+        level: int) -> None:
+    """ Stats worker process entry, serves requests until "stop"."""
+    set_debug_level(level)
+    storage.set_tokenizer(tokenizer)
+    stats_database = database.StatsDatabase(database_path, legacy_guild)
+    replies.put((0, store.restore(stats_database.call(stats_database.read)), None))
+    while True:
+        request_id, name, args = requests.get()
+        if name == "stop":
+            break
+        result: Any = None
+        error: (str | None) = None
+        try:
+            if name == "save":
+                changes = store.changes()
+                stats_database.call(lambda connection: stats_database.write(connection, changes))
+                result = sum(len(_[1]) for _ in changes)
+            elif name in EVENTS or name in QUERIES:
+                result = getattr(store, name)(*args)
+            else:
+                error = f"unknown request '{name}'"
+        except Exception as e: # pylint: disable=broad-except
+            debug_output(f"Stats worker failed on '{name}': {e}", 0)
+            error = repr(e)
+        if request_id is not None:
+            replies.put((request_id, result, error))
+    asyncio.run(stats_database.close())
+    debug_output("Stats worker stopped.", 1)
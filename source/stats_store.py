@@ -0,0 +1,165 @@
+""" Statistics aggregation store module.
+
+Owns statistics of every served guild and defines the protocol used to
+reach them: events change statistics and never answer, queries only read
+them. Arguments and results are plain picklable values, so the store can
+live in the bot process or in a separate worker process.
+"""
+
+# Type annotation imports
+from __future__ import annotations
+
+# Spunya dependencies
+import database
+import storage
+from guild_stats import GuildConfig, GuildStats
+
+# names of store methods changing statistics, they never return anything
+EVENTS: frozenset[str] = frozenset((
+    "parse", "edit", "forget", "voice", "reconcile", "close_voice"))
+
+# names of store methods reading statistics
+QUERIES: frozenset[str] = frozenset((
+    "marks", "last_message_t", "top", "user_summary", "activity"))
+
+class StatsStore():
+    """ Statistics of every served guild."""
+
+    def __init__(self, guilds: dict[int, GuildConfig], message_cache_size: int = 50000):
+        """ Empty statistics store initializer."""
+        self.guild_configs: dict[int, GuildConfig] = guilds
+        self.message_cache_size: int = message_cache_size
+        self.partitions: dict[int, GuildStats] = {}
+
+    def partition(self, guild_id: (int | None)) -> (GuildStats | None):
+        """ Statistics of served guild, None for guilds missing in config."""
+        if guild_id is None:
+            return None
+        result = self.partitions.get(guild_id)
+        if result is None and guild_id in self.guild_configs:
+            result = self.partitions[guild_id] = GuildStats(
+                self.guild_configs[guild_id], self.message_cache_size)
+        return result
+
+    def restore(self, snapshots: dict[int, database.Snapshot]) -> int:
+        """ Load stored statistics of served guilds, returns number of loaded users."""
+        loaded = 0
+        for guild_id, snapshot in snapshots.items():
+            partition = self.partition(guild_id)
+            if partition is not None:
+                partition.restore(snapshot)
+                loaded += len(snapshot.users)
+        return loaded
+
+    def changes(self) -> list[database.GuildChanges]:
+        """ Statistics of every guild changed since the last call."""
+        return [_.changes() for _ in self.partitions.values()]
+
+    ### Events
+
+    def parse(
+            self,
+            guild_id: int,
+            channel_id: int,
+            messages: list[storage.MessageEvent],
+            last_message_id: (int | None)) -> None:
+        """ Collect stats from a batch of messages of one channel, None keeps its mark."""
+        partition = self.partition(guild_id)
+        if partition is not None:
+            partition.parse_messages(channel_id, messages, last_message_id)
+
+    def edit(self, guild_id: int, message_id: int, content: str) -> None:
+        """ Replace words of an edited message."""
+        partition = self.partition(guild_id)
+        if partition is not None:
+            partition.edit_message(message_id, content)
+
+    def forget(self, guild_id: int, message_ids: list[int]) -> None:
+        """ Remove stats of deleted messages."""
+        partition = self.partition(guild_id)
+        if partition is not None:
+            for message_id in message_ids:
+                partition.forget_message(message_id)
+
+    def voice(self, guild_id: int, user_id: int, mode: (str | None), now: float) -> None:
+        """ Start a new voice session segment of user."""
+        partition = self.partition(guild_id)
+        if partition is not None:
+            partition.user_stats(user_id).voice_segment(mode, now)
+
+    def reconcile(self, guild_id: int, connected: dict[int, str], now: float) -> None:
+        """ Match open voice sessions with members currently connected to guild."""
+        partition = self.partition(guild_id)
+        if partition is None:
+            return
+        for user_stats in partition.stats.values():
+            if user_stats.voice_mode is not None and user_stats.user_id not in connected:
+                user_stats.voice_segment(None, now)
+        for user_id, mode in connected.items():
+            user_stats = partition.user_stats(user_id)
+            if user_stats.voice_mode != mode:
+                user_stats.voice_segment(mode, now)
+
+    def close_voice(self, now: float) -> None:
+        """ Close every open voice session."""
+        for partition in self.partitions.values():
+            for user_stats in partition.stats.values():
+                if user_stats.voice_mode is not None:
+                    user_stats.voice_segment(None, now)
+
+    ### Queries
+
+    def marks(self, guild_id: int) -> dict[int, int]:
+        """ Last parsed message id of every guild channel."""
+        partition = self.partition(guild_id)
+        return {} if partition is None else dict(partition.marks)
+
+    def last_message_t(self, guild_id: int, user_id: int) -> float:
+        """ Timestamp of the latest message of user, 0 if none."""
+        partition = self.partition(guild_id)
+        if partition is None or user_id not in partition.stats:
+            return 0
+        return float(partition.stats[user_id].last_message_t)
+
+    def top(self, guild_id: int) -> str:
+        """ Printable guild message leaderboard."""
+        partition = self.partition(guild_id)
+        return "" if partition is None else partition.get_stats()
+
+    def user_summary(
+            self,
+            guild_id: int,
+            user_id: int,
+            now: float) -> (tuple[int, list[tuple[str, int]], tuple[float, float, float]] | None):
+        """ Message count, top words and voice times of user, None if user is unknown."""
+        partition = self.partition(guild_id)
+        if partition is None or user_id not in partition.stats:
+            return None
+        user_stats = partition.stats[user_id]
+        return user_stats.message_count, user_stats.top_words(10), user_stats.voice_time(now)
+
+    def activity(
+            self,
+            guild_id: int,
+            window: str,
+            now: float,
+            user_id: (int | None) = None,
+            channel_id: (int | None) = None) -> (tuple[int | str, list[int]] | None):
+        """ Activity in 'window' and hour of day histogram.
+
+        Number of messages of user or channel if one is given, printable
+        guild leaderboards otherwise. None if user is unknown.
+        """
+        partition = self.partition(guild_id)
+        if partition is None:
+            return None
+        if user_id is not None:
+            if user_id not in partition.stats:
+                return None
+            counts = partition.stats[user_id].activity
+            return counts.count(window, now), list(counts.hours)
+        if channel_id is not None:
+            counts = partition.channel_activity.get(channel_id, storage.Activity())
+            return counts.count(window, now), list(counts.hours)
+        hours = [sum(_) for _ in zip([0] * 24, *(_.hours for _ in partition.channel_activity.values()))]
+        return partition.get_activity(window, now), hours
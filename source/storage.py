@@ -2,47 +2,518 @@
 
 # Type annotations and time dependencies
 from __future__ import annotations
+from typing import Iterable
 import datetime
 
-# Regular expressions for filtering words
-import re
+# Ordered containers for leaderboards and activity counters
+import bisect
+import heapq
+import itertools
+from array import array
 
 # Discord.py API dependencies
 import discord
 
+# Spunya dependencies
+from database import UserRecord
+from utils.tokenizer import Tokenizer
+
+# message words normaliser shared by all statistics
+tokenizer: Tokenizer = Tokenizer()
+
+def set_tokenizer(value: Tokenizer) -> None:
+    """ Sets message words normaliser."""
+    global tokenizer # pylint: disable=global-statement
+    tokenizer = value
+
+class Leaderboard():
+    """ Users ordered by message count, updated incrementally.
+
+    Users are grouped in buckets of equal count, distinct counts are kept
+    sorted, so an update costs a bucket move and top-N does not sort anything.
+    """
+
+    def __init__(self) -> None:
+        """ Empty leaderboard initializer."""
+        self.counts: dict[int, int] = {}
+        self.buckets: dict[int, set[int]] = {}
+        self.levels: list[int] = []
+
+    def update(self, user_id: int, count: int) -> None:
+        """ Set message count of user."""
+        old = self.counts.get(user_id)
+        if old == count:
+            return
+        if old is not None:
+            bucket = self.buckets[old]
+            bucket.discard(user_id)
+            if len(bucket) == 0:
+                del self.buckets[old]
+                del self.levels[bisect.bisect_left(self.levels, old)]
+        self.counts[user_id] = count
+        if count not in self.buckets:
+            self.buckets[count] = set()
+            bisect.insort(self.levels, count)
+        self.buckets[count].add(user_id)
+
+    def top(self, count: int = 3) -> list[tuple[int, int]]:
+        """ Users with most messages as (user id, message count) pairs."""
+        result: list[tuple[int, int]] = []
+        for level in reversed(self.levels):
+            for user_id in sorted(self.buckets[level]):
+                if len(result) >= count:
+                    return result
+                result.append((user_id, level))
+        return result
+
+class Vocabulary():
+    """ Guild-wide interned words, every distinct word is stored once."""
+
+    __slots__ = ("ids", "words")
+
+    def __init__(self) -> None:
+        """ Empty vocabulary initializer."""
+        self.ids: dict[str, int] = {}
+        self.words: list[str] = []
+
+    def intern(self, word: str) -> int:
+        """ Integer id of 'word', new words get the next id."""
+        word_id = self.ids.get(word)
+        if word_id is None:
+            word_id = len(self.words)
+            self.ids[word] = word_id
+            self.words.append(word)
+        return word_id
+
+    def __len__(self) -> int:
+        """ Number of distinct words."""
+        return len(self.words)
+
+class TopWords():
+    """ Most used words of a single user, updated incrementally.
+
+    Word counts mostly grow, so a word outside of top can only enter it
+    by exceeding the least counted top word. Decreased top words make the
+    top stale and it is rebuilt from all counts.
+    """
+
+    __slots__ = ("capacity", "top", "floor")
+
+    def __init__(self, capacity: int = 10):
+        """ Top words tracker initializer."""
+        self.capacity: int = capacity
+        self.top: dict[int, int] = {}
+        self.floor: int = 0
+
+    def update(self, word_id: int, count: int) -> None:
+        """ Notice new count of word."""
+        old = self.top.get(word_id)
+        if old is not None:
+            self.top[word_id] = count
+            # the least counted top word grew, floor moves up
+            if old <= self.floor:
+                self.floor = min(self.top.values())
+        elif len(self.top) < self.capacity:
+            self.top[word_id] = count
+            self.floor = min(self.top.values())
+        elif count > self.floor:
+            del self.top[min(self.top, key=self.top.__getitem__)]
+            self.top[word_id] = count
+            self.floor = min(self.top.values())
+
+    def rebuild(self, counts: dict[int, int]) -> None:
+        """ Recompute top from all user word counts."""
+        self.top = dict(heapq.nlargest(self.capacity, counts.items(), key=lambda x: x[1]))
+        self.floor = min(self.top.values(), default=0)
+
+    def items(self, count: int) -> list[tuple[int, int]]:
+        """ At most 'count' most used word ids, most used first."""
+        return sorted(self.top.items(), key=lambda x: x[1], reverse=True)[:count]
+
+class WordCounts():
+    """ Word usage of a single user.
+
+    Counts are kept in a sparse map keyed by vocabulary ids, so word
+    strings are shared by all users instead of being copied per user.
+    """
+
+    __slots__ = ("vocabulary", "counts", "top")
+
+    def __init__(self, vocabulary: Vocabulary):
+        """ Empty word counts initializer."""
+        self.vocabulary: Vocabulary = vocabulary
+        self.counts: dict[int, int] = {}
+        self.top: TopWords = TopWords()
+
+    def add(self, words: Iterable[str]) -> None:
+        """ Count every word occurrence."""
+        self.add_ids(map(self.vocabulary.intern, words))
+
+    def add_ids(self, word_ids: Iterable[int]) -> None:
+        """ Count every occurrence of interned words."""
+        counts, top = self.counts, self.top
+        for word_id in word_ids:
+            count = counts.get(word_id, 0) + 1
+            counts[word_id] = count
+            top.update(word_id, count)
+
+    def remove_ids(self, word_ids: Iterable[int]) -> None:
+        """ Uncount every occurrence of interned words."""
+        counts, stale = self.counts, False
+        for word_id in word_ids:
+            count = counts.get(word_id, 0) - 1
+            if count > 0:
+                counts[word_id] = count
+            else:
+                counts.pop(word_id, None)
+            stale = stale or word_id in self.top.top
+        if stale:
+            self.top.rebuild(counts)
+
+    def load(self, words: dict[str, int]) -> None:
+        """ Replace counts with stored ones."""
+        intern = self.vocabulary.intern
+        self.counts = {intern(word): count for word, count in words.items()}
+        self.top.rebuild(self.counts)
+
+    def as_dict(self) -> dict[str, int]:
+        """ Counts keyed by word strings."""
+        words = self.vocabulary.words
+        return {words[word_id]: count for word_id, count in self.counts.items()}
+
+    def most_common(self, count: int) -> list[tuple[str, int]]:
+        """ At most 'count' most used words, most used first."""
+        if count > self.top.capacity:
+            ids = heapq.nlargest(count, self.counts.items(), key=lambda x: x[1])
+        else:
+            ids = self.top.items(count)
+        words = self.vocabulary.words
+        return [(words[word_id], n) for word_id, n in ids]
+
+    def __len__(self) -> int:
+        """ Number of distinct words used."""
+        return len(self.counts)
+
+# bucket widths in seconds and number of buckets kept by activity counters
+HOUR: int = 3600
+DAY: int = 24 * HOUR
+HOURLY_BUCKETS: int = 48
+DAILY_BUCKETS: int = 35
+
+# activity windows as (counter, number of latest buckets)
+WINDOWS: dict[str, tuple[str, int]] = {
+    "day": ("hourly", 24),
+    "week": ("daily", 7),
+    "month": ("daily", 30),
+}
+
+class RingCounter():
+    """ Message counts in fixed-width time buckets over a sliding period.
+
+    Buckets live in a ring of fixed size, moving to a new bucket clears the
+    expired ones, so memory does not grow with history length.
+    """
+
+    __slots__ = ("width", "counts", "head")
+
+    def __init__(self, width: int, size: int):
+        """ Empty counter initializer.
+
+        Keyword arguments:
+        width -- Bucket width in seconds.
+        size -- Number of latest buckets kept.
+        """
+        self.width: int = width
+        self.counts: array[int] = array("I", bytes(4 * size))
+        # index of the latest bucket since epoch
+        self.head: int = 0
+
+    def add(self, t: float, count: int = 1) -> None:
+        """ Count 'count' messages sent at timestamp 't', negative 'count' uncounts them."""
+        index, size = int(t // self.width), len(self.counts)
+        if index > self.head and count < 0:
+            return
+        if index > self.head:
+            for i in range(max(self.head + 1, index - size + 1), index + 1):
+                self.counts[i % size] = 0
+            self.head = index
+        elif index <= self.head - size:
+            # older than the whole ring
+            return
+        self.counts[index % size] = max(self.counts[index % size] + count, 0)
+
+    def total(self, buckets: int, now: float) -> int:
+        """ Number of messages in the latest 'buckets' buckets up to 'now'."""
+        end, size = int(now // self.width), len(self.counts)
+        start = max(end - buckets, self.head - size) + 1
+        return sum(self.counts[i % size] for i in range(start, min(end, self.head) + 1))
+
+    def load(self, data: list[int]) -> None:
+        """ Restore stored '[head, count, ...]' list."""
+        if len(data) == len(self.counts) + 1:
+            self.head = data[0]
+            self.counts = array("I", data[1:])
+
+    def as_list(self) -> list[int]:
+        """ Counter as '[head, count, ...]' list."""
+        return [self.head, *self.counts]
+
+class Activity():
+    """ Time distribution of messages of a user or a channel.
+
+    Keeps hourly and daily counters for windowed leaderboards
+    and an hour of day histogram over whole history.
+    """
+
+    __slots__ = ("hourly", "daily", "hours")
+
+    def __init__(self) -> None:
+        """ Empty activity initializer."""
+        self.hourly: RingCounter = RingCounter(HOUR, HOURLY_BUCKETS)
+        self.daily: RingCounter = RingCounter(DAY, DAILY_BUCKETS)
+        self.hours: array[int] = array("I", bytes(4 * 24))
+
+    def add(self, timestamps: Iterable[float]) -> None:
+        """ Count messages sent at 'timestamps'."""
+        for t in timestamps:
+            self.hourly.add(t)
+            self.daily.add(t)
+            self.hours[int(t // HOUR) % 24] += 1
+
+    def remove(self, t: float) -> None:
+        """ Uncount message sent at 't'."""
+        self.hourly.add(t, -1)
+        self.daily.add(t, -1)
+        hour = int(t // HOUR) % 24
+        self.hours[hour] = max(self.hours[hour] - 1, 0)
+
+    def count(self, window: str, now: float) -> int:
+        """ Number of messages in one of activity 'WINDOWS' up to 'now'."""
+        counter, buckets = WINDOWS[window]
+        return self.hourly.total(buckets, now) if counter == "hourly" else self.daily.total(buckets, now)
+
+    def load(self, data: dict[str, list[int]]) -> None:
+        """ Restore stored activity."""
+        self.hourly.load(data.get("hourly", []))
+        self.daily.load(data.get("daily", []))
+        if len(data.get("hours", [])) == 24:
+            self.hours = array("I", data["hours"])
+
+    def as_dict(self) -> dict[str, list[int]]:
+        """ Activity as plain lists for storage."""
+        return {
+            "hourly": self.hourly.as_list(),
+            "daily": self.daily.as_list(),
+            "hours": list(self.hours),
+        }
+
+def most_active(
+        activities: Iterable[tuple[int, Activity]],
+        window: str,
+        now: float,
+        count: int = 5) -> list[tuple[int, int]]:
+    """ Ids with most messages in 'window' as (id, message count) pairs."""
+    totals = ((key, activity.count(window, now)) for key, activity in activities)
+    return [_ for _ in heapq.nlargest(count, totals, key=lambda x: x[1]) if _[1] > 0]
+
+class MessageEvent():
+    """ Compact parsed part of a message, cheap to pass to another process."""
+
+    __slots__ = ("message_id", "author_id", "t", "content")
+
+    def __init__(self, message_id: int, author_id: int, t: float, content: str):
+        """ Message event initializer."""
+        self.message_id: int = message_id
+        self.author_id: int = author_id
+        self.t: float = t
+        self.content: str = content
+
+    def __getstate__(self) -> tuple[int, int, float, str]:
+        """ Pickled as a plain tuple."""
+        return self.message_id, self.author_id, self.t, self.content
+
+    def __setstate__(self, state: tuple[int, int, float, str]) -> None:
+        """ Restore pickled event."""
+        self.message_id, self.author_id, self.t, self.content = state
+
+    @classmethod
+    def from_message(cls, message: discord.Message) -> MessageEvent:
+        """ Event of discord message."""
+        return cls(message.id, message.author.id, message.created_at.timestamp(), message.content)
+
+class MessageFingerprint():
+    """ What a single parsed message added to statistics."""
+
+    __slots__ = ("author_id", "channel_id", "t", "words")
+
+    def __init__(self, author_id: int, channel_id: int, t: float, words: tuple[int, ...]):
+        """ Message fingerprint initializer."""
+        self.author_id: int = author_id
+        self.channel_id: int = channel_id
+        self.t: float = t
+        self.words: tuple[int, ...] = words
+
+class MessageCache():
+    """ Fingerprints of the latest parsed messages.
+
+    At most 'capacity' messages are kept, the oldest messages by id are
+    evicted first, so crawling history newest first does not push out the
+    recent messages edits and deletes usually refer to.
+    """
+
+    __slots__ = ("capacity", "entries", "ids")
+
+    def __init__(self, capacity: int = 50000):
+        """ Empty message cache initializer."""
+        self.capacity: int = capacity
+        self.entries: dict[int, MessageFingerprint] = {}
+        # min-heap of message ids, ids of popped entries are dropped lazily
+        self.ids: list[int] = []
+
+    def remember(self, message_id: int, fingerprint: MessageFingerprint) -> None:
+        """ Store fingerprint of parsed message."""
+        if self.capacity <= 0 or message_id in self.entries:
+            return
+        ids, entries = self.ids, self.entries
+        if len(entries) >= self.capacity:
+            while ids[0] not in entries:
+                heapq.heappop(ids)
+            if message_id < ids[0]:
+                return
+            del entries[heapq.heappop(ids)]
+        entries[message_id] = fingerprint
+        heapq.heappush(ids, message_id)
+
+    def get(self, message_id: int) -> (MessageFingerprint | None):
+        """ Fingerprint of message if it is still cached."""
+        return self.entries.get(message_id)
+
+    def pop(self, message_id: int) -> (MessageFingerprint | None):
+        """ Forget and return fingerprint of deleted message."""
+        fingerprint = self.entries.pop(message_id, None)
+        if len(self.ids) > 2 * max(self.capacity, len(self.entries)):
+            self.ids = list(self.entries)
+            heapq.heapify(self.ids)
+        return fingerprint
+
+    def __len__(self) -> int:
+        """ Number of cached fingerprints."""
+        return len(self.entries)
+
+# voice session segment modes, time is counted in all of them
+VOICE_MODES: tuple[str, ...] = ("active", "muted", "afk")
+
 class UserStats():
-    """ Collectable statistics for discord.Member object."""
+    """ Collectable statistics of a guild user.
+
+    Only user id is kept, member objects are resolved by commands when needed.
+    """
+
+    __slots__ = (
+        "user_id", "message_count", "words", "activity", "last_voice_t", "voice_mode",
+        "t", "muted_t", "afk_t", "last_message_t", "dirty")
 
-    def __init__(self, member: discord.Member, message_count: int = 0):
+    def __init__(self, user_id: int, vocabulary: Vocabulary, message_count: int = 0):
         """ User statistics object initializer."""
-        self.member: discord.Member = member
+        self.user_id: int = user_id
         self.message_count: int = message_count
-        self.words: dict[str, int] = {}
+        self.words: WordCounts = WordCounts(vocabulary)
+        self.activity: Activity = Activity()
 
+        # open voice session segment start and mode, -1 and None if not connected
         self.last_voice_t: float = -1
+        self.voice_mode: (str | None) = None
+        # total time in voice channels and its muted and AFK parts
         self.t: float = 0
+        self.muted_t: float = 0
+        self.afk_t: float = 0
         self.last_message_t: float = datetime.datetime.utcfromtimestamp(0).timestamp()
 
-    def parse_message(self, message: discord.Message) -> None:
-        """ Parse statistics from discord.Message object."""
-        self.message_count += 1
-        for word in message.content.split():
-            word = re.sub(r"\W|\d|_", "", word).lower()
-            if len(word) <= 3:
-                continue
-            if not word in self.words:
-                self.words[word] = 1
-            else:
-                self.words[word] += 1
-        self.last_message_t = max(message.created_at.timestamp(), self.last_message_t)
+        # set whenever statistics differ from the stored snapshot
+        self.dirty: bool = False
+
+    def parse_message(self, message: MessageEvent) -> None:
+        """ Parse statistics from a single message."""
+        self.parse_messages([message])
+
+    def parse_messages(
+            self,
+            messages: list[MessageEvent],
+            word_ids: (list[tuple[int, ...]] | None) = None) -> None:
+        """ Parse statistics from several messages of this user at once.
+
+        Interned words of every message are used if given, instead of tokenizing them again.
+        """
+        self.message_count += len(messages)
+        if word_ids is None:
+            self.words.add(tokenizer.tokenize_many(_.content for _ in messages))
+        else:
+            self.words.add_ids(itertools.chain.from_iterable(word_ids))
+        timestamps = [_.t for _ in messages]
+        self.activity.add(timestamps)
+        self.last_message_t = max(max(timestamps), self.last_message_t)
+        self.dirty = True
+
+    def forget_message(self, fingerprint: MessageFingerprint) -> None:
+        """ Remove statistics of deleted message."""
+        self.message_count = max(self.message_count - 1, 0)
+        self.words.remove_ids(fingerprint.words)
+        self.activity.remove(fingerprint.t)
+        self.dirty = True
+
+    def edit_message(self, fingerprint: MessageFingerprint, words: tuple[int, ...]) -> None:
+        """ Replace words of edited message."""
+        self.words.remove_ids(fingerprint.words)
+        self.words.add_ids(words)
+        fingerprint.words = words
+        self.dirty = True
+
+    def voice_segment(self, mode: (str | None), now: float) -> None:
+        """ Close current voice session segment and open a new one in 'mode'.
+
+        Mode is one of VOICE_MODES, None means user is not connected.
+        """
+        if self.voice_mode is not None:
+            elapsed = max(now - self.last_voice_t, 0)
+            self.t += elapsed
+            if self.voice_mode == "muted":
+                self.muted_t += elapsed
+            elif self.voice_mode == "afk":
+                self.afk_t += elapsed
+            self.dirty = True
+        self.voice_mode = mode
+        self.last_voice_t = -1 if mode is None else now
+
+    def voice_time(self, now: float) -> tuple[float, float, float]:
+        """ Total, muted and AFK voice time including open segment."""
+        t, muted_t, afk_t = self.t, self.muted_t, self.afk_t
+        if self.voice_mode is not None:
+            elapsed = max(now - self.last_voice_t, 0)
+            t += elapsed
+            muted_t += elapsed if self.voice_mode == "muted" else 0
+            afk_t += elapsed if self.voice_mode == "afk" else 0
+        return t, muted_t, afk_t
+
+    def restore(self, record: UserRecord) -> None:
+        """ Load statistics from stored database record."""
+        self.message_count = record.message_count
+        self.last_message_t = record.last_message_t
+        self.t = record.voice_t
+        self.muted_t = record.muted_t
+        self.afk_t = record.afk_t
+        self.words.load(record.words)
+        self.activity.load(record.activity)
+
+    def record(self) -> UserRecord:
+        """ Copy statistics into database record."""
+        return UserRecord(
+            self.user_id, self.message_count, self.last_message_t, self.t,
+            self.words.as_dict(), self.activity.as_dict(), self.muted_t, self.afk_t)
 
     def top_words(self, count: int = 3) -> list[tuple[str, int]]:
         """ Guild most popular words for active member."""
-        result = []
-        for el in reversed(sorted(list(self.words.items()), key=lambda x: x[1])[-count:]):
-            result.append(el)
-        return result
+        return self.words.most_common(count)
 
     def __str__(self) -> str:
         """ Default string representation."""
-        return f"<@{self.member.id}>: {self.message_count}"
+        return f"<@{self.user_id}>: {self.message_count}"
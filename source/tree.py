@@ -4,8 +4,9 @@
 from __future__ import annotations
 from typing import Any, cast
 
-# Random library usage for bot commands
+# Random library and time usage for bot commands
 import random
+import time
 
 # Discord.py API dependencies
 import discord
@@ -15,8 +16,10 @@ from discord import app_commands
 # Spunya bot dependencies
 from spunya import Spunya
 
-from logic.artifacts import parse_artifact_info
+from logic.artifacts import parse_artifact_info, load_inventory, rate_inventory
+from logic.artifacts import FOCUS, default_mode, upgrade_potential
 from utils.json_loader import load_json
+from utils.logger import debug_output
 
 def parse_seconds(t: int) -> str:
     """ Transform 't' seconds into readable format."""
@@ -29,43 +32,111 @@ def parse_seconds(t: int) -> str:
         return f"{minutes} мин {seconds} с"
     return f"{hours} ч {minutes} мин"
 
-def load_command_tree(bot: Spunya, guild_id: int) -> None:
-    """ Initialize and append discord API command tree."""
+def hour_histogram(hours: list[int]) -> str:
+    """ Transform messages per hour of day into text bar chart."""
+    peak = max(max(hours), 1)
+    lines = [f"{hour:02}: {'█' * round(count * 20 / peak)} {count}" for hour, count in enumerate(hours)]
+    return "```\n" + "\n".join(lines) + "\n```"
+
+class MeteredCommandTree(app_commands.CommandTree[discord.Client]):
+    """ Command tree recording latency of every slash command and autocomplete."""
+
+    def __init__(self, bot: Spunya):
+        """ Metered command tree initializer."""
+        super().__init__(bot)
+        self.bot: Spunya = bot
+
+    async def _call(self, interaction: discord.Interaction[discord.Client]) -> None:
+        """ Runs invoked command and records it as "/name" handler."""
+        data: dict[str, Any] = cast(dict[str, Any], interaction.data or {})
+        name = f"/{data.get('name', '?')}"
+        if interaction.type is discord.InteractionType.autocomplete:
+            name += " autocomplete"
+        started = self.bot.metrics.start(name)
+        failed = True
+        try:
+            await super()._call(interaction)
+            failed = interaction.command_failed
+        finally:
+            self.bot.metrics.finish(name, started, failed)
+
+def load_command_tree(bot: Spunya, guild_ids: list[int]) -> None:
+    """ Initialize and append discord API command tree, commands are added to every served guild."""
     # initialize command tree
-    tree = app_commands.CommandTree(bot)
-    guild = discord.Object(id = guild_id)
+    tree = MeteredCommandTree(bot)
+    guilds = [discord.Object(id = _) for _ in guild_ids]
+
+    def guild_id(interaction: discord.Interaction[discord.Client]) -> int:
+        """ Served guild command was used in."""
+        if not bot.serves(interaction.guild_id) or interaction.guild_id is None:
+            raise app_commands.NoPrivateMessage()
+        return interaction.guild_id
 
     # "/top" command
-    @tree.command(name = "top", description = "Статистика сообщений на сервере", guild = guild)
+    @tree.command(name = "top", description = "Статистика сообщений на сервере", guilds = guilds)
     async def top(interaction: discord.Interaction[discord.Client]) -> None:
         """ Bot command that gives server-wide message statistics."""
-        await interaction.response.send_message(bot.get_stats())
+        await interaction.response.send_message(await bot.stats.query("top", guild_id(interaction)))
 
     # "/stats" command
     @tree.command(
             name = "stats",
-            description = "Статистика сообщений пользователя \
-            (время в каналах работает после переподключения)",
-            guild = guild)
+            description = "Статистика сообщений и времени в голосовых каналах пользователя",
+            guilds = guilds)
     @app_commands.describe(user = "Пользователь на сервере")
     async def stats(
         interaction: discord.Interaction[discord.Client],
         user: (discord.Member | None) = None) -> None:
         """ Bot command that gives user message statistics."""
         user_id = interaction.user.id if user is None else user.id
-        words = bot.stats[user_id].top_words(10)
-        count = bot.stats[user_id].message_count
-        t = parse_seconds(int(bot.stats[user_id].t))
+        summary = await bot.stats.query("user_summary", guild_id(interaction), user_id, time.time())
+        if summary is None:
+            await interaction.response.send_message(f"У пользователя <@{user_id}> пока нет сообщений")
+            return
+        count, words, voice_time = summary
+        t, muted_t, afk_t = (parse_seconds(int(_)) for _ in voice_time)
         result = ""
         for i in range(1, len(words) + 1):
             result += f"{i}. {words[i - 1][0]} ({words[i - 1][1]} раз)\n"
         await interaction.response.send_message(
             f"Количество сообщений пользователя <@{user_id}>: {count}\n" +
-            f"Время в голосовых каналах: {t}\n" +
+            f"Время в голосовых каналах: {t} (без микрофона {muted_t}, AFK {afk_t})\n" +
             f"Самые популярные слова:\n{result}")
 
+    # "/activity" command
+    @tree.command(name = "activity", description = "Активность на сервере за период и по часам (UTC)", guilds = guilds)
+    @app_commands.describe(period = "Период")
+    @app_commands.describe(user = "Пользователь на сервере")
+    @app_commands.describe(channel = "Текстовый канал")
+    @app_commands.choices(period = [
+        app_commands.Choice(name = "День", value = "day"),
+        app_commands.Choice(name = "Неделя", value = "week"),
+        app_commands.Choice(name = "Месяц", value = "month")])
+    async def activity(
+        interaction: discord.Interaction[discord.Client],
+        period: str = "week",
+        user: (discord.Member | None) = None,
+        channel: (discord.TextChannel | None) = None) -> None:
+        """ Bot command with windowed leaderboards and hour of day histogram."""
+        answer = await bot.stats.query(
+            "activity", guild_id(interaction), period, time.time(),
+            None if user is None else user.id,
+            None if channel is None else channel.id)
+        if answer is None:
+            await interaction.response.send_message("Пока нет сообщений")
+            return
+        count, hours = answer
+        if user is not None:
+            result = f"Сообщений пользователя <@{user.id}>: {count}\n"
+        elif channel is not None:
+            result = f"Сообщений в канале <#{channel.id}>: {count}\n"
+        else:
+            result = count
+        await interaction.response.send_message(
+            result + "Сообщения по часам (UTC):\n" + hour_histogram(hours))
+
     # "/roll" command
-    @tree.command(name = "roll", description = "Случайное число 1-100", guild = guild)
+    @tree.command(name = "roll", description = "Случайное число 1-100", guilds = guilds)
     @app_commands.describe(low = "От")
     @app_commands.describe(high = "До")
     async def roll(
@@ -76,13 +147,54 @@ def load_command_tree(bot: Spunya, guild_id: int) -> None:
         num = random.randint(low, high)
         await interaction.response.send_message(num)
 
-    @tree.command(name = "help", description = "Список команд Спуни", guild = guild)
+    # "/reload" command
+    @tree.command(name = "reload", description = "Перезагрузить ответы Спуни", guilds = guilds)
+    @app_commands.default_permissions(administrator = True)
+    async def reload(interaction: discord.Interaction[discord.Client]) -> None:
+        """ Admin command reloading chat replies from 'communication.json'."""
+        try:
+            count = bot.communication.reload()
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            debug_output(f"Failed to reload replies: {e}", 0)
+            await interaction.response.send_message(f"Не получилось перезагрузить ответы: {e}", ephemeral = True)
+            return
+        await interaction.response.send_message(f"Ответы перезагружены, триггеров: {count}", ephemeral = True)
+
+    # "/metrics" command
+    @tree.command(name = "metrics", description = "Задержки обработчиков Спуни", guilds = guilds)
+    @app_commands.default_permissions(administrator = True)
+    async def metrics(interaction: discord.Interaction[discord.Client]) -> None:
+        """ Admin command with the slowest handlers and event loop lag."""
+        await interaction.response.send_message(bot.metrics.summary(), ephemeral = True)
+
+    # "/profile" command
+    @tree.command(name = "profile", description = "Профилировать Спуню", guilds = guilds)
+    @app_commands.default_permissions(administrator = True)
+    @app_commands.describe(seconds = "Длительность профилирования")
+    async def profile(interaction: discord.Interaction[discord.Client], seconds: app_commands.Range[int, 1, 300] = 30) -> None:
+        """ Admin command toggling the event loop sampling profiler."""
+        if bot.profiler.running:
+            await interaction.response.send_message(
+                f"Профилирование остановлено: `{bot.profiler.stop()}`", ephemeral = True)
+            return
+        path = bot.profiler.start(seconds)
+        await interaction.response.send_message(
+            f"Профилирование на {seconds} с, результат: `{path}`", ephemeral = True)
+
+    @tree.command(name = "help", description = "Список команд Спуни", guilds = guilds)
     async def help_command(interaction: discord.Interaction[discord.Client]) -> None:
         """ Bot command with list of all featured commands."""
         await interaction.response.send_message(
             "top   - Топ отправленных сообщений на сервере\n" +
             "stats - Статистика пользователя (кол-во сообщений и самые популярные)\n" +
             "roll  - Случайное число\n" +
+            "rate  - Оценка артефакта\n" +
+            "inventory - Рейтинг артефактов из файла\n" +
+            "potential - Шансы артефакта при улучшении до +20\n" +
+            "activity - Активность за период и по часам\n" +
+            "reload - Перезагрузить ответы (для администраторов)\n" +
+            "metrics - Задержки обработчиков (для администраторов)\n" +
+            "profile - Профилирование (для администраторов)\n" +
             "help  - Вызов помощи")
 
     async def rate_autocomplete(
@@ -98,7 +210,7 @@ def load_command_tree(bot: Spunya, guild_id: int) -> None:
     @tree.command(
             name = "rate",
             description = "Оценка артефакта. Воспользуйтесь если картинкой не работает.",
-            guild = guild)
+            guilds = guilds)
     @app_commands.autocomplete(proc1 = rate_autocomplete)
     @app_commands.autocomplete(proc2 = rate_autocomplete)
     @app_commands.autocomplete(proc3 = rate_autocomplete)
@@ -125,5 +237,63 @@ def load_command_tree(bot: Spunya, guild_id: int) -> None:
         ])
         await interaction.followup.send(proc)
 
+    @tree.command(
+            name = "potential",
+            description = "Стоит ли улучшать артефакт: распределение RV на +20",
+            guilds = guilds)
+    @app_commands.autocomplete(proc1 = rate_autocomplete)
+    @app_commands.autocomplete(proc2 = rate_autocomplete)
+    @app_commands.autocomplete(proc3 = rate_autocomplete)
+    @app_commands.autocomplete(proc4 = rate_autocomplete)
+    @app_commands.describe(focus = "Полезные характеристики")
+    @app_commands.describe(target = "Желаемый RV в процентах")
+    @app_commands.choices(focus = [app_commands.Choice(name = _, value = _) for _ in FOCUS])
+    async def potential(
+        interaction: discord.Interaction[discord.Client],
+        lvl: int,
+        proc1: str,
+        proc1_v: float,
+        proc2: str,
+        proc2_v: float,
+        proc3: str,
+        proc3_v: float,
+        proc4: str,
+        proc4_v: float,
+        focus: str = "crit",
+        target: (float | None) = None) -> None:
+        """ Upgrade potential of artifact."""
+        answer = upgrade_potential(lvl, [
+            (proc1, default_mode(proc1), proc1_v),
+            (proc2, default_mode(proc2), proc2_v),
+            (proc3, default_mode(proc3), proc3_v),
+            (proc4, default_mode(proc4), proc4_v)
+        ], focus, target)
+        await interaction.response.send_message(answer or "Не получилось оценить артефакт :(")
+
+    @tree.command(
+            name = "inventory",
+            description = "Рейтинг артефактов из экспорта инвентаря (GOOD JSON или CSV)",
+            guilds = guilds)
+    @app_commands.describe(file = "Файл инвентаря")
+    @app_commands.describe(sort = "Сортировка")
+    @app_commands.choices(sort = [
+        app_commands.Choice(name = "Roll value", value = "rv"),
+        app_commands.Choice(name = "Crit value", value = "cv")])
+    async def inventory(
+        interaction: discord.Interaction[discord.Client],
+        file: discord.Attachment,
+        sort: str = "rv") -> None:
+        """ Batch version of artifact rater for whole inventory."""
+        await interaction.response.defer()
+        if file.size > 8 * 1024 * 1024:
+            await interaction.followup.send("Файл слишком большой :(")
+            return
+        try:
+            answer = rate_inventory(load_inventory(await file.read(), file.filename), sort)
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            debug_output(f"Failed to read inventory {file.filename}: {e}", 1)
+            answer = ""
+        await interaction.followup.send(answer or "Не получилось найти артефакты в файле :(")
+
     # append created tree to bot
     bot.tree = tree
@@ -1,29 +1,138 @@
-""" Image text extractor module."""
+""" Image text extractor module.
+
+Attachments are downloaded asynchronously and recognized in a bounded
+process pool, so OCR never runs on the event loop. Already recognized
+images are served from cache.
+"""
+
+# Type annotation dependencies
+from __future__ import annotations
+from typing import Callable
+
+# Asynchronous and process pool dependencies
+import asyncio
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
 # Image loader dependencies
 from io import BytesIO
 import re
-from requests import Response, get
 from PIL import Image
 
-# Image text parser module
-import pytesseract
+# Discord.py API dependencies
+import discord
 
 # Debug loger module
 from utils.logger import debug_output
+from utils.ocr_cache import CacheEntry, OcrCache
+from utils.ocr_backend import image_to_string, init_worker
+from utils.image_preprocess import preprocess
+
+class PipelineFull(Exception):
+    """ Raised when too many images are already waiting for recognition."""
 
-def load_text_image(img_url: str) -> str:
-    """ Gets text from image in given url."""
-    # load attached image
-    response: Response = get(img_url, timeout=60000)
-    img = Image.open(BytesIO(response.content))
+def extract_text(data: bytes, crop: bool = True) -> str:
+    """ Gets text from image bytes. Runs in OCR worker process.
+
+    If 'crop' is set only preprocessed artifact stat panel is recognized.
+    """
+    img = Image.open(BytesIO(data))
     img.load()
     if img is None: return ""
+    if crop:
+        img = preprocess(img)
 
     # extract text from image
-    text: str = pytesseract.image_to_string(img, lang="rus")
+    text: str = image_to_string(img)
     text = re.sub(r"\n\n", "\n", text)
     text = re.sub(r"[^(\d)(\w)(\n)-,. %]|[_]", " ", text)
     text = re.sub(r"  ", " ", text)
-    debug_output(f"Found text in picture: {text}", 1)
     return text
+
+def fingerprint(data: bytes) -> int:
+    """ Gets 64 bit perceptual difference hash of image bytes. Runs in OCR worker process."""
+    img = Image.open(BytesIO(data)).convert("L").resize((9, 8))
+    pixels = list(img.getdata())
+    result = 0
+    for row in range(8):
+        for col in range(8):
+            result = (result << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return result
+
+class OcrPipeline():
+    """ Asynchronous attachment download followed by OCR in worker processes."""
+
+    def __init__(
+            self,
+            workers: int = 2,
+            queue_depth: int = 8,
+            cache: (OcrCache | None) = None,
+            backend: str = "tesserocr",
+            crop: bool = True):
+        """ OCR pipeline initializer.
+
+        Keyword arguments:
+        workers -- Number of OCR worker processes.
+        queue_depth -- Maximum number of images being downloaded, waiting or recognized.
+        cache -- Cache of recognized images, a private in-memory one if None.
+        backend -- OCR engine name from 'utils.ocr_backend.BACKENDS' kept alive in every worker.
+        crop -- Preprocess images, so only artifact stat panel is recognized.
+        """
+        self.workers: int = max(workers, 1)
+        self.queue_depth: int = max(queue_depth, self.workers)
+        self.pending: int = 0
+        self.pool: (ProcessPoolExecutor | None) = None
+        self.cache: OcrCache = OcrCache() if cache is None else cache
+        self.backend: str = backend
+        self.crop: bool = crop
+
+    def executor(self) -> ProcessPoolExecutor:
+        """ Worker pool, started on first use."""
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_worker,
+                initargs=(self.backend,))
+        return self.pool
+
+    async def recognize(
+            self,
+            attachment: discord.Attachment,
+            parse: Callable[[str], str]) -> tuple[str, str]:
+        """ Gets text from attached image and its 'parse' result.
+
+        Raises PipelineFull if 'queue_depth' images are already in progress.
+        """
+        if self.pending >= self.queue_depth:
+            raise PipelineFull()
+        self.pending += 1
+        try:
+            data: bytes = await attachment.read()
+            digest = hashlib.sha256(data).hexdigest()
+            entry = await self.cache.get(digest)
+            if entry is None:
+                loop = asyncio.get_running_loop()
+                phash, similar = 0, None
+                if self.cache.match_similar:
+                    phash = await loop.run_in_executor(self.executor(), fingerprint, data)
+                    similar = self.cache.similar(phash)
+                text: str = await loop.run_in_executor(self.executor(), extract_text, data, self.crop)
+                debug_output(f"Found text in picture: {text}", 1)
+                # visually matching image is only trusted if it reads the same
+                if similar is not None and similar.text == text:
+                    entry = CacheEntry(digest, phash, text, similar.result)
+                else:
+                    entry = CacheEntry(digest, phash, text, parse(text))
+                await self.cache.put(entry)
+        finally:
+            self.pending -= 1
+        return entry.text, entry.result
+
+    async def shutdown(self) -> None:
+        """ Stop worker processes and close cache."""
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
+            self.pool = None
+        await self.cache.close()
@@ -0,0 +1,93 @@
+""" Artifact screenshot preprocessing module.
+
+Crops artifact stat panel out of the screenshot, normalises its size and
+converts it to a black and white image before OCR. Game UI around the
+panel only costs recognition time and produces garbage text.
+"""
+
+# Type annotation dependencies
+from __future__ import annotations
+
+# Image dependencies
+from PIL import Image, ImageOps
+
+# light beige background of artifact stat panel
+PANEL_COLOR: tuple[int, int, int] = (236, 229, 216)
+PANEL_TOLERANCE: int = 24
+
+# size of image used to search for the panel
+SEARCH_SIZE: int = 256
+
+# width of panel passed to OCR
+TARGET_WIDTH: int = 720
+
+def find_panel(img: Image.Image) -> (tuple[int, int, int, int] | None):
+    """ Find bounding box of artifact stat panel.
+
+    Rows and columns mostly filled with panel background color form the box.
+    Returns None if no panel of reasonable size was found.
+    """
+    scale = SEARCH_SIZE / max(img.size)
+    small = img.convert("RGB").resize(
+        (max(int(img.width * scale), 1), max(int(img.height * scale), 1)))
+    width, height = small.size
+
+    # mark pixels close to panel background
+    r0, g0, b0 = PANEL_COLOR
+    pixels = small.tobytes()
+    mask = [
+        abs(pixels[i] - r0) + abs(pixels[i + 1] - g0) + abs(pixels[i + 2] - b0) <= PANEL_TOLERANCE * 3
+        for i in range(0, len(pixels), 3)]
+    rows = [sum(mask[y * width:(y + 1) * width]) for y in range(height)]
+    cols = [sum(mask[x::width]) for x in range(width)]
+
+    # panel spans a large part of screenshot width, its columns cover most of panel rows
+    filled_rows = [y for y in range(height) if rows[y] >= width * 0.3]
+    filled_cols = [x for x in range(width) if cols[x] >= max(len(filled_rows), 1) * 0.5]
+    if len(filled_rows) < height * 0.1 or len(filled_cols) < width * 0.1:
+        return None
+    return (
+        int(filled_cols[0] / scale),
+        int(filled_rows[0] / scale),
+        int((filled_cols[-1] + 1) / scale),
+        int((filled_rows[-1] + 1) / scale))
+
+def otsu_threshold(img: Image.Image) -> int:
+    """ Gray level best separating text from background."""
+    histogram = img.histogram()[:256]
+    total = sum(histogram)
+    total_sum = sum(i * count for i, count in enumerate(histogram))
+    background_sum, background_count = 0.0, 0
+    best, threshold = -1.0, 127
+    for level in range(256):
+        background_count += histogram[level]
+        if background_count == 0:
+            continue
+        foreground_count = total - background_count
+        if foreground_count == 0:
+            break
+        background_sum += level * histogram[level]
+        background_mean = background_sum / background_count
+        foreground_mean = (total_sum - background_sum) / foreground_count
+        variance = background_count * foreground_count * (background_mean - foreground_mean) ** 2
+        if variance > best:
+            best, threshold = variance, level
+    return threshold
+
+def preprocess(img: Image.Image) -> Image.Image:
+    """ Crop stat panel, normalise size and binarize image for OCR."""
+    box = find_panel(img)
+    if box is not None:
+        img = img.crop(box)
+
+    # normalise width, text height stays in a range tesseract reads best
+    scale = TARGET_WIDTH / img.width
+    img = img.resize((TARGET_WIDTH, max(int(img.height * scale), 1)), Image.Resampling.LANCZOS)
+
+    # dark text on light background
+    gray = ImageOps.autocontrast(img.convert("L"))
+    threshold = otsu_threshold(gray)
+    binary = gray.point(lambda level: 255 if level > threshold else 0)
+    if sum(binary.histogram()[:128]) > binary.width * binary.height / 2:
+        binary = ImageOps.invert(binary)
+    return binary
@@ -1,6 +1,21 @@
-""" Debug info logger module."""
+""" Debug info logger module.
+
+Records go through the standard 'logging' package: the level is checked
+before anything is formatted, message arguments are merged only for
+enabled records and console and file output is written by a listener
+thread, so the event loop never blocks on I/O.
+"""
 
 from __future__ import annotations
+from typing import Any
+
+# Standard logging with queue handlers
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
 
 class bcolors:
     """ ANSI escape sequences"""
@@ -14,7 +29,84 @@ class bcolors:
     BOLD      = '\033[1m'
     UNDERLINE = '\033[4m'
 
-__DEBUG_OUTPUT_LEVEL: (int | None)
+# debug level 0 is logged as INFO, every next level 5 lower, so 2 is DEBUG
+BASE_LEVEL: int = logging.INFO
+LEVEL_STEP: int = 5
+# levels above TRACE log the same as TRACE, lower ones would reach NOTSET
+MAX_DEBUG_LEVEL: int = 3
+
+logging.addLevelName(BASE_LEVEL - LEVEL_STEP, "VERBOSE")
+logging.addLevelName(BASE_LEVEL - MAX_DEBUG_LEVEL * LEVEL_STEP, "TRACE")
+
+logger: logging.Logger = logging.getLogger("spunya")
+logger.propagate = False
+
+__DEBUG_OUTPUT_LEVEL: (int | None) = None
+__LISTENER: (logging.handlers.QueueListener | None) = None
+
+def logging_level(level: int) -> int:
+    """ Standard logging level of debug 'level'."""
+    return BASE_LEVEL - LEVEL_STEP * min(level, MAX_DEBUG_LEVEL)
+
+class StructuredFormatter(logging.Formatter):
+    """ Appends key=value fields of a record to its message."""
+
+    def __init__(self, fmt: str, colored: bool = False):
+        """ Formatter initializer, 'colored' adds record color escapes."""
+        super().__init__(fmt, "%Y-%m-%d %H:%M:%S")
+        self.colored: bool = colored
+
+    def format(self, record: logging.LogRecord) -> str:
+        """ Format record message followed by its fields."""
+        text = super().format(record)
+        fields: dict[str, Any] = getattr(record, "fields", {})
+        if len(fields) != 0:
+            text += " " + " ".join(f"{key}={value!r}" for key, value in fields.items())
+        if self.colored:
+            color: str = getattr(record, "color", bcolors.OKBLUE)
+            text = text.replace("[DEBUG]", f"{color}{bcolors.BOLD}[DEBUG]{bcolors.ENDC}", 1)
+        return text
+
+def setup_logging(
+        level: int,
+        path: (str | None) = None,
+        max_bytes: int = 10 * 1024 * 1024,
+        backups: int = 5) -> None:
+    """ Sets debug output level and starts the logging listener thread.
+
+    Records are printed to console and, if 'path' is given, written to
+    rotating files of at most 'max_bytes' keeping 'backups' old files.
+    Calling it again replaces previous handlers.
+    """
+    global __LISTENER # pylint: disable=global-statement
+    stop_logging()
+    set_debug_level(level)
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(StructuredFormatter("[DEBUG] %(message)s", colored=True))
+    handlers: list[logging.Handler] = [console]
+    if path is not None:
+        directory = os.path.dirname(path)
+        if directory != "":
+            os.makedirs(directory, exist_ok=True)
+        rotating = logging.handlers.RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+        rotating.setFormatter(StructuredFormatter("%(asctime)s %(levelname)s %(message)s"))
+        handlers.append(rotating)
+    records: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    logger.handlers = [logging.handlers.QueueHandler(records)]
+    __LISTENER = logging.handlers.QueueListener(records, *handlers, respect_handler_level=False)
+    __LISTENER.start()
+
+def stop_logging() -> None:
+    """ Writes queued records and stops the listener thread."""
+    global __LISTENER # pylint: disable=global-statement
+    if __LISTENER is not None:
+        __LISTENER.stop()
+        for handler in __LISTENER.handlers:
+            handler.close()
+        __LISTENER = None
+
+atexit.register(stop_logging)
 
 def set_debug_level(level: int) -> None:
     """ Sets debug output level.
@@ -23,10 +115,27 @@ def set_debug_level(level: int) -> None:
     3 logs every sent message. Level -1 disables debug logging."""
     global __DEBUG_OUTPUT_LEVEL # pylint: disable=global-statement
     __DEBUG_OUTPUT_LEVEL = level
+    logger.setLevel(logging_level(level))
+
+def debug_level() -> int:
+    """ Current debug output level."""
+    return 0 if __DEBUG_OUTPUT_LEVEL is None else __DEBUG_OUTPUT_LEVEL
+
+def enabled(level: int) -> bool:
+    """ Whether records of debug 'level' are written."""
+    return logger.isEnabledFor(logging_level(level))
+
+def log(level: int, msg: str, /, *args: Any, color: str = bcolors.OKBLUE, **fields: Any) -> None:
+    """ Logs 'msg' with lazy %-style 'args' and structured key=value 'fields'.
+
+    Nothing is formatted unless debug 'level' is enabled, e.g.
+    log(3, "New message: %r", message.content, guild=guild.id).
+    """
+    if __LISTENER is None:
+        setup_logging(debug_level())
+    if logger.isEnabledFor(logging_level(level)):
+        logger.log(logging_level(level), msg, *args, extra={"fields": fields, "color": color})
 
 def debug_output(text: str, level: int, mode: str = bcolors.OKBLUE) -> None:
-    global __DEBUG_OUTPUT_LEVEL # pylint: disable=global-statement
-    if __DEBUG_OUTPUT_LEVEL is None:
-        __DEBUG_OUTPUT_LEVEL = 0
-    if level <= __DEBUG_OUTPUT_LEVEL:
-        print(f"{mode}{bcolors.BOLD}[DEBUG]{bcolors.ENDC} {text}")
+    """ Logs preformatted 'text', prefer 'log' with lazy arguments."""
+    log(level, "%s", text, color=mode)
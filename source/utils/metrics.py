@@ -0,0 +1,188 @@
+""" Runtime metrics module.
+
+Counts dispatched events and slash commands, their latency histograms,
+failures and in-flight handlers, and measures event loop lag. Recording
+a handler costs two clock reads and a few dict updates, so metrics stay
+enabled in production. Metrics are exposed in Prometheus text format.
+"""
+
+# Type annotation dependencies
+from __future__ import annotations
+from typing import Any
+
+# Asynchronous server and timing dependencies
+import asyncio
+import bisect
+import time
+
+# Debug output logger
+from utils.logger import log
+
+# upper bounds of latency buckets in seconds
+LATENCY_BUCKETS: tuple[float, ...] = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram():
+    """ Observations counted in fixed buckets."""
+
+    __slots__ = ("bounds", "counts", "count", "sum")
+
+    def __init__(self, bounds: tuple[float, ...] = LATENCY_BUCKETS):
+        """ Empty histogram initializer, the last bucket is unbounded."""
+        self.bounds: tuple[float, ...] = bounds
+        self.counts: list[int] = [0] * (len(bounds) + 1)
+        self.count: int = 0
+        self.sum: float = 0
+
+    def observe(self, value: float) -> None:
+        """ Count single observation."""
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """ Upper bound of bucket holding 'q' quantile, inf if it is unbounded."""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank and seen != 0:
+                return bound
+        return float("inf")
+
+class Timer():
+    """ Context manager recording a handler into metrics."""
+
+    __slots__ = ("metrics", "name", "started")
+
+    def __init__(self, metrics: Metrics, name: str):
+        """ Timer initializer."""
+        self.metrics: Metrics = metrics
+        self.name: str = name
+        self.started: float = 0
+
+    def __enter__(self) -> Timer:
+        self.started = self.metrics.start(self.name)
+        return self
+
+    def __exit__(self, kind: Any, value: Any, traceback: Any) -> None:
+        self.metrics.finish(self.name, self.started, kind is not None)
+
+class Metrics():
+    """ Handler counters, latencies and event loop lag."""
+
+    def __init__(self, lag_interval: float = 1.0):
+        """ Metrics initializer.
+
+        Keyword arguments:
+        lag_interval -- Seconds between event loop lag probes.
+        """
+        self.calls: dict[str, int] = {}
+        self.failures: dict[str, int] = {}
+        self.in_flight: dict[str, int] = {}
+        self.latency: dict[str, Histogram] = {}
+        self.lag_interval: float = lag_interval
+        self.lag: Histogram = Histogram()
+        self.last_lag: float = 0
+        self.started_t: float = time.time()
+
+    def start(self, name: str) -> float:
+        """ Handler 'name' started, returns value passed to 'finish'."""
+        self.in_flight[name] = self.in_flight.get(name, 0) + 1
+        return time.perf_counter()
+
+    def finish(self, name: str, started: float, failed: bool = False) -> None:
+        """ Handler 'name' started at 'started' is done."""
+        elapsed = time.perf_counter() - started
+        self.in_flight[name] -= 1
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if failed:
+            self.failures[name] = self.failures.get(name, 0) + 1
+        histogram = self.latency.get(name)
+        if histogram is None:
+            histogram = self.latency[name] = Histogram()
+        histogram.observe(elapsed)
+
+    def fail(self, name: str) -> None:
+        """ Count failure of handler whose exception was already handled."""
+        self.failures[name] = self.failures.get(name, 0) + 1
+
+    def timer(self, name: str) -> Timer:
+        """ Context manager recording enclosed code as handler 'name'."""
+        return Timer(self, name)
+
+    async def monitor_loop(self) -> None:
+        """ Measure how late the event loop wakes up sleeping tasks, runs forever."""
+        while True:
+            expected = time.perf_counter() + self.lag_interval
+            await asyncio.sleep(self.lag_interval)
+            self.last_lag = max(time.perf_counter() - expected, 0)
+            self.lag.observe(self.last_lag)
+
+    def render(self) -> str:
+        """ All metrics in Prometheus text exposition format."""
+        lines = [
+            "# TYPE spunya_uptime_seconds gauge",
+            f"spunya_uptime_seconds {time.time() - self.started_t:.3f}",
+            "# TYPE spunya_handler_calls_total counter"]
+        lines += [f'spunya_handler_calls_total{{handler="{_}"}} {n}' for _, n in sorted(self.calls.items())]
+        lines.append("# TYPE spunya_handler_failures_total counter")
+        lines += [f'spunya_handler_failures_total{{handler="{_}"}} {n}' for _, n in sorted(self.failures.items())]
+        lines.append("# TYPE spunya_handler_in_flight gauge")
+        lines += [f'spunya_handler_in_flight{{handler="{_}"}} {n}' for _, n in sorted(self.in_flight.items())]
+        lines.append("# TYPE spunya_handler_latency_seconds histogram")
+        for name, histogram in sorted(self.latency.items()):
+            lines += histogram_lines("spunya_handler_latency_seconds", histogram, f'handler="{name}",')
+        lines += [
+            "# TYPE spunya_loop_lag_seconds gauge",
+            f"spunya_loop_lag_seconds {self.last_lag:.6f}",
+            "# TYPE spunya_loop_lag_seconds_histogram histogram"]
+        lines += histogram_lines("spunya_loop_lag_seconds_histogram", self.lag, "")
+        return "\n".join(lines) + "\n"
+
+    def summary(self, count: int = 15) -> str:
+        """ Printable table of handlers taking the most total time."""
+        rows = sorted(self.latency.items(), key=lambda _: _[1].sum, reverse=True)[:count]
+        lines = [f"{'handler':<28} {'calls':>7} {'fail':>5} {'avg ms':>8} {'p99 ms':>8} {'now':>4}"]
+        for name, histogram in rows:
+            lines.append(
+                f"{name[:28]:<28} {histogram.count:>7} {self.failures.get(name, 0):>5} "
+                f"{histogram.sum * 1000 / max(histogram.count, 1):>8.1f} "
+                f"{histogram.quantile(0.99) * 1000:>8.0f} {self.in_flight.get(name, 0):>4}")
+        lines.append(f"loop lag: {self.last_lag * 1000:.1f} ms, p99 {self.lag.quantile(0.99) * 1000:.0f} ms")
+        return "```\n" + "\n".join(lines) + "\n```"
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 9100) -> asyncio.AbstractServer:
+        """ Start HTTP endpoint answering every request with rendered metrics."""
+        server = await asyncio.start_server(self.answer, host, port)
+        log(1, "Serving metrics on http://%s:%d/metrics", host, port)
+        return server
+
+    async def answer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """ Answer single HTTP request with rendered metrics."""
+        try:
+            # skip request line and headers
+            while (await asyncio.wait_for(reader.readline(), 5)) not in (b"\r\n", b"\n", b""):
+                pass
+            body = self.render().encode()
+            writer.write(
+                b"HTTP/1.0 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+def histogram_lines(name: str, histogram: Histogram, labels: str) -> list[str]:
+    """ Prometheus lines of cumulative buckets, sum and count of 'histogram'."""
+    lines = []
+    seen = 0
+    for bound, count in zip(histogram.bounds, histogram.counts):
+        seen += count
+        lines.append(f'{name}_bucket{{{labels}le="{bound}"}} {seen}')
+    lines.append(f'{name}_bucket{{{labels}le="+Inf"}} {histogram.count}')
+    suffix = "" if labels == "" else f"{{{labels.rstrip(',')}}}"
+    lines.append(f"{name}_sum{suffix} {histogram.sum:.6f}")
+    lines.append(f"{name}_count{suffix} {histogram.count}")
+    return lines
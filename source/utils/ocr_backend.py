@@ -0,0 +1,85 @@
+""" OCR engine backends module.
+
+Every OCR worker process keeps a single engine instance alive, so the
+language model is loaded once per process instead of once per image.
+"""
+
+# Type annotation dependencies
+from __future__ import annotations
+from typing import Any
+
+# Image dependencies
+from PIL import Image
+
+# Image text parser module
+import pytesseract
+
+# Debug loger module
+from utils.logger import debug_output
+
+class OcrBackend():
+    """ Base OCR engine, gets text from loaded image."""
+
+    def __init__(self, lang: str = "rus"):
+        """ OCR engine initializer."""
+        self.lang: str = lang
+
+    def image_to_string(self, img: Image.Image) -> str:
+        """ Recognize text in image."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """ Release engine resources."""
+
+class SubprocessBackend(OcrBackend):
+    """ Starts a new 'tesseract' process for every image via pytesseract."""
+
+    def image_to_string(self, img: Image.Image) -> str:
+        """ Recognize text in image."""
+        return str(pytesseract.image_to_string(img, lang=self.lang))
+
+class TesserocrBackend(OcrBackend):
+    """ Resident Tesseract engine via C API bindings (requires 'tesserocr')."""
+
+    def __init__(self, lang: str = "rus"):
+        """ Load language model once."""
+        super().__init__(lang)
+        import tesserocr # pylint: disable=import-outside-toplevel
+        self.api: Any = tesserocr.PyTessBaseAPI(lang=lang)
+
+    def image_to_string(self, img: Image.Image) -> str:
+        """ Recognize text in image."""
+        self.api.SetImage(img)
+        return str(self.api.GetUTF8Text())
+
+    def close(self) -> None:
+        """ Unload language model."""
+        self.api.End()
+
+BACKENDS: dict[str, type[OcrBackend]] = {
+    "pytesseract": SubprocessBackend,
+    "tesserocr": TesserocrBackend,
+}
+
+def create_backend(name: str, lang: str = "rus") -> OcrBackend:
+    """ Create OCR engine by name, falls back to pytesseract if unavailable."""
+    try:
+        return BACKENDS[name](lang)
+    except (KeyError, ImportError, RuntimeError) as e:
+        debug_output(f"OCR backend '{name}' is unavailable ({e}), using pytesseract.", 0)
+        return SubprocessBackend(lang)
+
+# engine of current OCR worker process
+engine: (OcrBackend | None) = None
+
+def init_worker(name: str, lang: str = "rus") -> None:
+    """ OCR worker process initializer, loads engine once."""
+    global engine # pylint: disable=global-statement
+    engine = create_backend(name, lang)
+
+def image_to_string(img: Image.Image) -> str:
+    """ Recognize text with engine of current process."""
+    global engine # pylint: disable=global-statement
+    if engine is None:
+        engine = SubprocessBackend()
+    return engine.image_to_string(img)
@@ -0,0 +1,147 @@
+""" Recognized artifact image cache module.
+
+Entries are keyed by attachment content hash. Re-encoded copies of the same
+screenshot can optionally be matched by perceptual hash distance among
+in-memory entries. Stored results carry the version of the code producing
+them, results of other versions are dropped.
+"""
+
+# Type annotation dependencies
+from __future__ import annotations
+from typing import Callable, TypeVar
+
+# Cache containers and database dependencies
+from collections import OrderedDict
+import sqlite3
+
+# Spunya dependencies
+from database import Database
+
+# list of cache schema migrations, index + 1 is a resulting 'user_version'
+MIGRATIONS: list[str] = [
+    """
+    CREATE TABLE images (
+        digest TEXT PRIMARY KEY,
+        phash TEXT NOT NULL,
+        text TEXT NOT NULL,
+        result TEXT NOT NULL
+    );
+    """,
+    """
+    ALTER TABLE images ADD COLUMN version TEXT NOT NULL DEFAULT '';
+    """,
+]
+
+T = TypeVar("T")
+
+class CacheEntry():
+    """ Recognition result of a single image."""
+
+    def __init__(self, digest: str, phash: int, text: str, result: str):
+        """ Cache entry initializer."""
+        self.digest: str = digest
+        self.phash: int = phash
+        self.text: str = text
+        self.result: str = result
+
+class OcrCache():
+    """ LRU cache of recognized images with optional on-disk tier."""
+
+    def __init__(
+            self,
+            capacity: int = 256,
+            path: (str | None) = None,
+            match_similar: bool = False,
+            max_distance: int = 6,
+            version: str = ""):
+        """ OCR cache initializer.
+
+        Keyword arguments:
+        capacity -- Maximum number of entries kept in memory.
+        path -- SQLite file for entries surviving restart, disabled if None.
+        match_similar -- Look up visually matching images, their text must still be confirmed.
+        max_distance -- Maximum perceptual hash bit distance of matching images.
+        version -- Version of OCR and parser settings, stored results of other versions are dropped.
+        """
+        self.capacity: int = max(capacity, 1)
+        self.match_similar: bool = match_similar
+        self.max_distance: int = max_distance
+        self.version: str = version
+        self.entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self.database: (Database | None) = None if path is None else Database(path, MIGRATIONS)
+        self.pruned: bool = False
+
+    async def get(self, digest: str) -> (CacheEntry | None):
+        """ Find entry with exactly the same content hash."""
+        if digest in self.entries:
+            self.entries.move_to_end(digest)
+            return self.entries[digest]
+        if self.database is None:
+            return None
+        entry: (CacheEntry | None) = await self.run(
+            lambda connection: select_entry(connection, digest, self.version))
+        if entry is not None:
+            self.remember(entry)
+        return entry
+
+    def similar(self, phash: int) -> (CacheEntry | None):
+        """ Find in-memory entry of a visually matching image, None unless 'match_similar' is set.
+
+        Different artifacts share the same game UI, so a match is only a
+        candidate whose text has to be confirmed by the caller.
+        """
+        if not self.match_similar:
+            return None
+        for entry in reversed(self.entries.values()):
+            if bin(entry.phash ^ phash).count("1") <= self.max_distance:
+                self.entries.move_to_end(entry.digest)
+                return entry
+        return None
+
+    async def put(self, entry: CacheEntry) -> None:
+        """ Store new entry in memory and on disk."""
+        self.remember(entry)
+        if self.database is not None:
+            await self.run(lambda connection: insert_entry(connection, entry, self.version))
+
+    async def run(self, func: Callable[[sqlite3.Connection], T]) -> T:
+        """ Execute 'func' in database thread, results of other versions are dropped first."""
+        assert self.database is not None
+        if not self.pruned:
+            self.pruned = True
+            await self.database.run(lambda connection: drop_stale(connection, self.version))
+        result: T = await self.database.run(func)
+        return result
+
+    def remember(self, entry: CacheEntry) -> None:
+        """ Store entry in memory evicting least recently used one."""
+        self.entries[entry.digest] = entry
+        self.entries.move_to_end(entry.digest)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    async def close(self) -> None:
+        """ Close on-disk tier."""
+        if self.database is not None:
+            await self.database.close()
+
+def select_entry(connection: sqlite3.Connection, digest: str, version: str) -> (CacheEntry | None):
+    """ Read stored entry of 'version' by content hash."""
+    row = connection.execute(
+        "SELECT digest, phash, text, result FROM images WHERE digest = ? AND version = ?",
+        (digest, version)).fetchone()
+    if row is None:
+        return None
+    return CacheEntry(row[0], int(row[1], 16), row[2], row[3])
+
+def insert_entry(connection: sqlite3.Connection, entry: CacheEntry, version: str) -> None:
+    """ Write entry of 'version' to disk."""
+    with connection:
+        connection.execute(
+            "INSERT OR REPLACE INTO images (digest, phash, text, result, version) VALUES (?, ?, ?, ?, ?)",
+            (entry.digest, f"{entry.phash:016x}", entry.text, entry.result, version))
+
+def drop_stale(connection: sqlite3.Connection, version: str) -> None:
+    """ Delete entries stored by other versions."""
+    with connection:
+        connection.execute("DELETE FROM images WHERE version != ?", (version,))
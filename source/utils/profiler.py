@@ -0,0 +1,122 @@
+""" Sampling profiler module.
+
+Samples the event loop thread stack from a separate thread for a bounded
+window, without restarting the bot under a profiler. Samples are tagged
+with the bot handler they were taken in and written in folded stack
+format, which flamegraph.pl, speedscope and inferno read directly.
+"""
+
+# Type annotation dependencies
+from __future__ import annotations
+from types import FrameType
+
+# Sampling thread and stack inspection dependencies
+from collections import Counter
+import os
+import sys
+import threading
+import time
+
+# Debug output logger
+from utils.logger import log
+
+# source files whose functions name a handler, slash commands live in 'tree.py'
+HANDLER_FILES: tuple[str, ...] = ("spunya.py", "tree.py", f"callbacks{os.sep}")
+
+def frame_name(frame: FrameType) -> str:
+    """ Printable 'module.function' name of frame."""
+    code = frame.f_code
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    # qualified names with class are available since Python 3.11
+    return f"{module}.{getattr(code, 'co_qualname', code.co_name)}".replace(";", ":")
+
+def is_handler(frame: FrameType) -> bool:
+    """ Whether frame is a public function of 'spunya.py', 'tree.py' or 'callbacks/*'.
+
+    Private dispatch wrappers such as '_run_event' are not handlers.
+    """
+    code = frame.f_code
+    return not code.co_name.startswith("_") and any(_ in code.co_filename for _ in HANDLER_FILES)
+
+def sample_stack(frame: (FrameType | None)) -> tuple[str, ...]:
+    """ Stack of frame outermost first, prefixed with the outermost handler name."""
+    names: list[str] = []
+    handler = "(loop)"
+    while frame is not None:
+        names.append(frame_name(frame))
+        if is_handler(frame):
+            handler = names[-1]
+        frame = frame.f_back
+    names.append(handler)
+    return tuple(reversed(names))
+
+class SamplingProfiler():
+    """ Event loop thread sampler, one window at a time."""
+
+    def __init__(self, directory: str = "profiles", interval: float = 0.005, max_duration: float = 300):
+        """ Sampling profiler initializer.
+
+        Keyword arguments:
+        directory -- Where folded stack files are written.
+        interval -- Seconds between samples.
+        max_duration -- Upper bound of a profiling window in seconds.
+        """
+        self.directory: str = directory
+        self.interval: float = interval
+        self.max_duration: float = max_duration
+        self.thread: (threading.Thread | None) = None
+        self.stopped: threading.Event = threading.Event()
+        self.path: (str | None) = None
+
+    @property
+    def running(self) -> bool:
+        """ Whether a profiling window is open."""
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, duration: float, target: (int | None) = None) -> str:
+        """ Start sampling thread 'target' for 'duration' seconds, returns output path.
+
+        Target defaults to the calling thread, so calling it from a handler
+        profiles the event loop.
+        """
+        if self.running:
+            raise RuntimeError("Profiler is already running")
+        duration = min(max(duration, self.interval), self.max_duration)
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, time.strftime("profile-%Y%m%d-%H%M%S.folded"))
+        self.stopped.clear()
+        self.thread = threading.Thread(
+            target=self.sample,
+            args=(threading.get_ident() if target is None else target, duration, self.path),
+            name="spunya-profiler",
+            daemon=True)
+        self.thread.start()
+        log(1, "Profiling event loop for %.0f s.", duration, path=self.path)
+        return self.path
+
+    def stop(self) -> (str | None):
+        """ Close profiling window early, returns output path."""
+        self.stopped.set()
+        return self.path
+
+    def toggle(self, duration: float) -> None:
+        """ Stop running profiler or start a new 'duration' window, used by signal handler."""
+        if self.running:
+            self.stop()
+        else:
+            self.start(duration)
+
+    def sample(self, target: int, duration: float, path: str) -> None:
+        """ Collect samples until window ends and write them, runs in profiler thread."""
+        samples: Counter[tuple[str, ...]] = Counter()
+        deadline = time.monotonic() + duration
+        while not self.stopped.wait(self.interval) and time.monotonic() < deadline:
+            frame = sys._current_frames().get(target) # pylint: disable=protected-access
+            if frame is None:
+                break
+            samples[sample_stack(frame)] += 1
+            del frame
+        with open(path, "w", encoding="utf-8") as file:
+            for stack, count in samples.most_common():
+                file.write(f"{';'.join(stack)} {count}\n")
+        log(1, "Profile written with %d samples.", sum(samples.values()), path=path)
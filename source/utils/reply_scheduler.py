@@ -0,0 +1,68 @@
+""" Delayed chat reply scheduler module."""
+
+# Type annotation dependencies
+from __future__ import annotations
+
+# Asynchronous scheduling and random delay dependencies
+import asyncio
+import random
+
+# Discord.py API dependencies
+import discord
+
+# Debug output logger
+from utils.logger import debug_output
+
+class ReplyScheduler():
+    """ Sends replies after human-like reaction and typing delays.
+
+    Delays are awaited in separate tasks, so the event loop keeps running
+    and replies in different channels are typed at the same time.
+    Replies in one channel are sent in the order they were scheduled.
+    """
+
+    def __init__(self, bot_cps: int = 300, max_reaction: float = 2, max_typing: float = 5):
+        """ Reply scheduler initializer.
+
+        Keyword arguments:
+        bot_cps -- Typing speed in characters per minute (300 cpm = 5 cps).
+        max_reaction -- Upper bound of random delay before typing starts.
+        max_typing -- Upper bound of "typing..." status duration.
+        """
+        self.chars_per_second: float = max(bot_cps, 1) / 60
+        self.max_reaction: float = max_reaction
+        self.max_typing: float = max_typing
+        self.locks: dict[int, asyncio.Lock] = {}
+        self.tasks: set[asyncio.Task[None]] = set()
+
+    def schedule(
+            self,
+            channel: discord.abc.MessageableChannel,
+            text: str,
+            reference: (discord.Message | discord.MessageReference | discord.PartialMessage | None) = None) -> None:
+        """ Start delayed reply without waiting for it."""
+        task = asyncio.create_task(self.deliver(channel, text, reference))
+        # keep reference to running task until it is done
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def deliver(
+            self,
+            channel: discord.abc.MessageableChannel,
+            text: str,
+            reference: (discord.Message | discord.MessageReference | discord.PartialMessage | None) = None) -> None:
+        """ Wait reaction time, show typing status and send reply."""
+        try:
+            # time to react on invocation
+            await asyncio.sleep(random.uniform(0, self.max_reaction))
+            lock = self.locks.setdefault(channel.id, asyncio.Lock())
+            async with lock:
+                # set "typing..." for time needed to type 'text'
+                async with channel.typing():
+                    await asyncio.sleep(min(len(text) / self.chars_per_second, self.max_typing))
+                if reference is not None:
+                    await channel.send(text, reference = reference)
+                else:
+                    await channel.send(text)
+        except discord.HTTPException as e:
+            debug_output(f"Failed to send reply to channel [{channel.id}]: {e}", 0)
@@ -0,0 +1,79 @@
+""" Chat message tokenizer module.
+
+Splits message text into normalised words with a single precompiled
+regular expression pass over the whole text.
+"""
+
+# Type annotation dependencies
+from __future__ import annotations
+from typing import Iterable
+
+# Regular expressions for filtering words
+import re
+
+# parts of message removed before splitting into words
+URL_PATTERN: str = r"https?://\S*"
+MENTION_PATTERN: str = r"<(?:@[!&]?|#)\d+>"
+EMOJI_PATTERN: str = r"<a?:\w+:\d+>"
+# non-word characters, digits and underscores are removed inside words
+JUNK_PATTERN: str = r"[^\w\s]|[\d_]"
+# whitespace character separating messages matched in one pass
+RECORD_SEPARATOR: str = "\x1e"
+
+class Tokenizer():
+    """ Configurable message text normaliser."""
+
+    def __init__(
+            self,
+            min_length: int = 4,
+            stop_words: Iterable[str] = (),
+            strip_mentions: bool = True,
+            strip_emoji: bool = True,
+            strip_urls: bool = True):
+        """ Tokenizer initializer.
+
+        Keyword arguments:
+        min_length -- Shorter words are skipped.
+        stop_words -- Words that are never counted.
+        strip_mentions -- Skip user, role and channel mentions.
+        strip_emoji -- Skip custom emoji instead of counting their names.
+        strip_urls -- Skip links instead of counting them as glued words.
+        """
+        self.min_length: int = min_length
+        self.stop_words: frozenset[str] = frozenset(_.lower() for _ in stop_words)
+        patterns = []
+        if strip_urls: patterns.append(URL_PATTERN)
+        if strip_mentions: patterns.append(MENTION_PATTERN)
+        if strip_emoji: patterns.append(EMOJI_PATTERN)
+        patterns.append(JUNK_PATTERN)
+        self.pattern: re.Pattern[str] = re.compile("|".join(patterns))
+
+    def tokenize(self, text: str) -> list[str]:
+        """ Normalised words of a single message."""
+        min_length, stop_words = self.min_length, self.stop_words
+        return [
+            word for word in self.pattern.sub("", text).lower().split()
+            if len(word) >= min_length and word not in stop_words]
+
+    def tokenize_many(self, texts: Iterable[str]) -> list[str]:
+        """ Normalised words of all messages in one pass."""
+        return self.tokenize("\n".join(texts))
+
+    def tokenize_each(self, texts: list[str]) -> list[list[str]]:
+        """ Normalised words of every message, all messages are matched in one pass.
+
+        Messages are joined with a record separator, which is whitespace
+        for the pattern, and split back after substitution.
+        """
+        if len(texts) == 0:
+            return []
+        joined = RECORD_SEPARATOR.join(_.replace(RECORD_SEPARATOR, " ") for _ in texts)
+        min_length, stop_words = self.min_length, self.stop_words
+        return [
+            [word for word in text.split() if len(word) >= min_length and word not in stop_words]
+            for text in self.pattern.sub("", joined).lower().split(RECORD_SEPARATOR)]
+
+    def count(self, texts: Iterable[str], words: dict[str, int]) -> None:
+        """ Add number of occurrences of every word in 'texts' to 'words'."""
+        for word in self.tokenize_many(texts):
+            words[word] = words.get(word, 0) + 1
@@ -0,0 +1,123 @@
+""" Chat reply triggers module.
+
+Trigger phrases of 'communication.json' are compiled into a single regular
+expression, so a message is matched against all of them in one pass.
+"""
+
+# Type annotation dependencies
+from __future__ import annotations
+from typing import Any, cast
+
+# Regular expressions for trigger matching
+import re
+
+# Spunya dependencies
+from utils.json_loader import load_json
+from utils.logger import debug_output
+
+# patterns put around a phrase for every boundary mode
+BOUNDARIES: dict[str, tuple[str, str]] = {
+    # anywhere in text, "где" matches "нигде"
+    "none": ("", ""),
+    # at word start, "пока" matches "покаааа" but not "показать"
+    "prefix": (r"(?<!\w)", ""),
+    # whole word only
+    "word": (r"(?<!\w)", r"(?!\w)"),
+}
+
+# default rules of trigger categories, higher priority wins
+DEFAULT_RULES: dict[str, dict[str, Any]] = {
+    "questions": {"priority": 2, "boundary": "none"},
+    "goodbyes": {"priority": 1, "boundary": "none"},
+}
+
+class Trigger():
+    """ Phrase starting a reply of some category."""
+
+    def __init__(self, category: str, phrase: str, answers: list[str], priority: int, order: int):
+        """ Trigger initializer.
+
+        Keyword arguments:
+        category -- Reply category, e.g. "questions".
+        answers -- Replies randomly chosen from when triggered.
+        order -- Position of phrase in category, earlier phrases win ties.
+        """
+        self.category: str = category
+        self.phrase: str = phrase
+        self.answers: list[str] = answers
+        self.rank: tuple[int, int] = (-priority, order)
+
+class TriggerMatcher():
+    """ All trigger phrases compiled into one pattern."""
+
+    def __init__(self, triggers: list[Trigger], boundaries: dict[str, str]):
+        """ Compile 'triggers', 'boundaries' holds boundary mode of every category."""
+        # best triggers first, so they win at the same position
+        self.triggers: list[Trigger] = sorted(triggers, key=lambda _: _.rank)
+        alternatives = []
+        for trigger in self.triggers:
+            start, end = BOUNDARIES[boundaries.get(trigger.category, "none")]
+            alternatives.append(f"({start}{re.escape(trigger.phrase)}{end})")
+        # zero width lookahead finds phrases overlapping each other
+        self.pattern: (re.Pattern[str] | None) = (
+            re.compile(f"(?=(?:{'|'.join(alternatives)}))") if len(alternatives) != 0 else None)
+
+    def match(self, text: str) -> (Trigger | None):
+        """ Best trigger found in lowercase 'text'."""
+        if self.pattern is None:
+            return None
+        best: (Trigger | None) = None
+        for found in self.pattern.finditer(text):
+            trigger = self.triggers[cast(int, found.lastindex) - 1]
+            if best is None or trigger.rank < best.rank:
+                best = trigger
+                if trigger is self.triggers[0]:
+                    break
+        return best
+
+def compile_triggers(replies: dict[str, Any]) -> TriggerMatcher:
+    """ Build matcher of question and goodbye triggers.
+
+    Optional "triggers" object of replies overrides category rules, e.g.
+    {"goodbyes": {"priority": 1, "boundary": "prefix"}}.
+    """
+    rules = {
+        category: {**rule, **replies.get("triggers", {}).get(category, {})}
+        for category, rule in DEFAULT_RULES.items()}
+    triggers: list[Trigger] = []
+    questions: dict[str, list[str]] = replies["questions"]
+    for order, (phrase, answers) in enumerate(questions.items()):
+        triggers.append(Trigger("questions", phrase.lower(), answers, rules["questions"]["priority"], order))
+    goodbyes: dict[str, list[str]] = replies["goodbyes"]
+    for order, phrase in enumerate(goodbyes["in"]):
+        triggers.append(Trigger("goodbyes", phrase.lower(), goodbyes["out"], rules["goodbyes"]["priority"], order))
+    for category, rule in rules.items():
+        if rule["boundary"] not in BOUNDARIES:
+            raise ValueError(f"Unknown boundary '{rule['boundary']}' of {category} triggers")
+    return TriggerMatcher(triggers, {category: rule["boundary"] for category, rule in rules.items()})
+
+class Communication():
+    """ Chat replies with compiled triggers, reloadable at runtime."""
+
+    def __init__(self, path: str = "resources/communication.json"):
+        """ Load replies from 'path'."""
+        self.path: str = path
+        self.replies: dict[str, Any] = {}
+        self.matcher: TriggerMatcher = TriggerMatcher([], {})
+        self.reload()
+
+    def reload(self) -> int:
+        """ Load replies again and recompile triggers, returns number of triggers.
+
+        Replies and matcher are replaced together only after both are built,
+        a broken file leaves the previous ones in use.
+        """
+        replies = cast(dict[str, Any], load_json(self.path))
+        matcher = compile_triggers(replies)
+        self.replies, self.matcher = replies, matcher
+        debug_output(f"Loaded {len(matcher.triggers)} reply triggers.", 1)
+        return len(matcher.triggers)
+
+    def match(self, text: str) -> (Trigger | None):
+        """ Best trigger found in lowercase 'text'."""
+        return self.matcher.match(text)
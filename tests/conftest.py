@@ -0,0 +1,6 @@
+""" Test configuration, bot modules are imported from 'source' like 'main.py' does."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "source"))
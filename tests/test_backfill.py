@@ -0,0 +1,57 @@
+""" Channel history backfill tests."""
+
+from __future__ import annotations
+from types import SimpleNamespace
+from typing import Any, AsyncIterator
+import asyncio
+
+import discord
+
+from backfill import Backfill, Cursor
+
+class FakeChannel():
+    """ Text channel with messages 1..'count', failing once after 'fail_after' messages."""
+
+    def __init__(self, count: int, fail_after: (int | None) = None):
+        self.id, self.name = 1, "general"
+        self.ids = list(range(1, count + 1))
+        self.fail_after = fail_after
+        self.calls: list[dict[str, Any]] = []
+
+    async def history(self, **kwargs: Any) -> AsyncIterator[Any]:
+        self.calls.append(kwargs)
+        assert kwargs["oldest_first"] and kwargs["limit"] is None
+        after, before = kwargs["after"].id, kwargs["before"].id
+        for sent, message_id in enumerate(_ for _ in self.ids if after < _ < before):
+            if self.fail_after is not None and sent == self.fail_after:
+                self.fail_after = None
+                raise discord.RateLimited(0)
+            yield SimpleNamespace(id=message_id)
+
+class FakeBot():
+    """ Bot collecting parsed batches."""
+
+    def __init__(self) -> None:
+        self.batches: list[list[int]] = []
+
+    def parse_messages(self, guild_id: int, messages: list[Any]) -> None:
+        self.batches.append([_.id for _ in messages])
+
+def test_cursor_starts_at_mark_or_horizon() -> None:
+    """ Never parsed channels start at horizon, parsed ones at their mark."""
+    assert Cursor(None, 100, 10).after == 10
+    cursor = Cursor(50, 100, 10)
+    assert cursor.after == 50
+    cursor.advance([SimpleNamespace(id=60), SimpleNamespace(id=70)])
+    assert (cursor.after, cursor.count) == (70, 2)
+
+def test_crawl_resumes_oldest_first_after_failure() -> None:
+    """ Retried crawl continues from the last parsed page, nothing is parsed twice or skipped."""
+    bot, channel = FakeBot(), FakeChannel(250, fail_after=130)
+    crawler = Backfill(bot, 1, {}, backoff=0, batch_size=50, before=200)
+    crawler.horizon = 0
+    asyncio.run(crawler.run([channel]))
+    parsed = [_ for batch in bot.batches for _ in batch]
+    assert parsed == list(range(1, 200))
+    assert [_["after"].id for _ in channel.calls] == [0, 100]
+    assert crawler.failed == []
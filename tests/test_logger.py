@@ -0,0 +1,14 @@
+""" Debug logger tests."""
+
+from __future__ import annotations
+
+from utils import logger
+
+def test_higher_level_never_logs_less() -> None:
+    """ Every debug level enables all lower ones, levels above TRACE included."""
+    try:
+        for level in range(-1, 8):
+            logger.setup_logging(level)
+            assert [logger.enabled(_) for _ in range(4)] == [_ <= level for _ in range(4)]
+    finally:
+        logger.stop_logging()
@@ -0,0 +1,86 @@
+""" Message fast-path filter tests."""
+
+from __future__ import annotations
+from types import SimpleNamespace
+from typing import Any
+from unittest import mock
+
+import discord
+
+from guild_stats import GuildConfig
+from message_filter import MessageFilter
+
+IGNORED_ROLE = 7
+
+def member(user_id: int, roles: tuple[int, ...] = (), bot: bool = False) -> Any:
+    """ Fake guild member."""
+    result = mock.Mock(spec=discord.Member)
+    result.id, result.bot, result.roles = user_id, bot, [SimpleNamespace(id=_) for _ in roles]
+    return result
+
+def user(user_id: int) -> Any:
+    """ Fake user missing in member cache."""
+    return SimpleNamespace(id=user_id, bot=False)
+
+def guild(*members: Any) -> Any:
+    """ Fake guild with cached 'members'."""
+    cached = {_.id: _ for _ in members}
+    return SimpleNamespace(id=1, get_member=cached.get)
+
+def message(where: Any, author: Any, channel_id: int = 11, parent_id: Any = None, webhook_id: Any = None) -> Any:
+    """ Fake message."""
+    return SimpleNamespace(
+        guild=where, author=author, webhook_id=webhook_id,
+        channel=SimpleNamespace(id=channel_id, parent_id=parent_id))
+
+def message_filter(capacity: int = 100000) -> MessageFilter:
+    """ Filter of guild 1 with ignored channel 10, role 7 and user 99."""
+    result = MessageFilter(
+        {1: GuildConfig(1, [10], ignored_roles=[IGNORED_ROLE], ignored_users=[99])}, capacity)
+    result.self_id = 5
+    return result
+
+def test_channels_and_authors() -> None:
+    """ Ignored channels, threads of them, users, roles, bots and self are rejected."""
+    where = guild()
+    rules = message_filter()
+    assert rules.accepts(message(where, member(2)))
+    assert not rules.accepts(message(SimpleNamespace(id=2), member(2)))
+    assert not rules.accepts(message(where, member(2), channel_id=10))
+    assert not rules.accepts(message(where, member(2), channel_id=12, parent_id=10))
+    assert not rules.accepts(message(where, member(3, (IGNORED_ROLE,))))
+    assert not rules.accepts(message(where, member(99)))
+    assert not rules.accepts(message(where, member(4, bot=True)))
+    assert not rules.accepts(message(where, member(5)))
+    assert not rules.accepts(message(where, member(2), webhook_id=1))
+
+def test_uncached_user_is_not_cached() -> None:
+    """ Plain user verdict does not hide roles of the member seen later."""
+    rules = message_filter()
+    assert rules.accepts(message(guild(), user(3)))
+    assert len(rules.verdicts) == 0
+    assert not rules.accepts(message(guild(), member(3, (IGNORED_ROLE,))))
+
+def test_user_resolved_through_member_cache() -> None:
+    """ Plain user author is judged by the cached member of guild."""
+    rules = message_filter()
+    assert not rules.accepts(message(guild(member(3, (IGNORED_ROLE,))), user(3)))
+    assert rules.verdicts == {(1, 3): False}
+
+def test_invalidation() -> None:
+    """ Role change and role delete drop cached verdicts."""
+    rules = message_filter()
+    where = guild()
+    assert not rules.accepts(message(where, member(3, (IGNORED_ROLE,))))
+    rules.forget_member(1, 3)
+    assert rules.accepts(message(where, member(3)))
+    assert not rules.accepts(message(where, member(4, (IGNORED_ROLE,))))
+    rules.forget_role(SimpleNamespace(id=IGNORED_ROLE, guild=where))
+    assert rules.accepts(message(where, member(4, (IGNORED_ROLE,))))
+
+def test_verdicts_are_bounded() -> None:
+    """ The oldest verdicts are dropped at capacity."""
+    rules = message_filter(capacity=3)
+    for user_id in range(20, 30):
+        rules.accepts(message(guild(), member(user_id)))
+    assert list(rules.verdicts) == [(1, 27), (1, 28), (1, 29)]
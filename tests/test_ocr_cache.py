@@ -0,0 +1,54 @@
+""" Recognized image cache tests."""
+
+from __future__ import annotations
+from types import SimpleNamespace
+from typing import Any
+import asyncio
+import sqlite3
+
+import pytest
+
+from utils import image_loader
+from utils.ocr_cache import CacheEntry, OcrCache
+
+def test_similar_match_is_opt_in() -> None:
+    """ Perceptual hash lookup finds nothing unless enabled."""
+    entry = CacheEntry("a", 0b1011, "text", "result")
+    cache = OcrCache()
+    cache.remember(entry)
+    assert cache.similar(0b1010) is None
+    cache.match_similar = True
+    assert cache.similar(0b1010) is entry
+
+def test_results_of_other_versions_are_dropped(tmp_path: Any) -> None:
+    """ Stored results survive restart of the same version only."""
+    path = str(tmp_path / "ocr.db")
+    async def store(version: str) -> None:
+        cache = OcrCache(path=path, version=version)
+        await cache.put(CacheEntry("a", 1, "text", f"result {version}"))
+        await cache.close()
+    async def load(version: str) -> (CacheEntry | None):
+        cache = OcrCache(path=path, version=version)
+        try:
+            return await cache.get("a")
+        finally:
+            await cache.close()
+    asyncio.run(store("1"))
+    assert asyncio.run(load("1")).result == "result 1"
+    assert asyncio.run(load("2")) is None
+    assert sqlite3.connect(path).execute("SELECT COUNT(*) FROM images").fetchone()[0] == 0
+
+@pytest.mark.parametrize("text, expected", [("same text", "cached"), ("other text", "parsed other text")])
+def test_similar_image_needs_same_text(monkeypatch: Any, text: str, expected: str) -> None:
+    """ Visually matching image reuses cached answer only if it reads the same."""
+    monkeypatch.setattr(image_loader, "fingerprint", lambda data: 0b1010)
+    monkeypatch.setattr(image_loader, "extract_text", lambda data, crop: text)
+    cache = OcrCache(match_similar=True)
+    cache.remember(CacheEntry("other", 0b1011, "same text", "cached"))
+    pipeline = image_loader.OcrPipeline(cache=cache)
+    monkeypatch.setattr(pipeline, "executor", lambda: None)
+    async def read() -> bytes:
+        return b"image"
+    attachment = SimpleNamespace(read=read)
+    _, result = asyncio.run(pipeline.recognize(attachment, lambda _: f"parsed {_}"))
+    assert result == expected
@@ -0,0 +1,42 @@
+""" Stats worker process backend tests."""
+
+from __future__ import annotations
+from pathlib import Path
+import asyncio
+
+import pytest
+
+from stats_backend import RemoteBackend, StatsBackend
+from stats_store import StatsStore
+
+def test_backend_is_abstract() -> None:
+    """ Base backend can not be created without implementing every method."""
+    with pytest.raises(TypeError):
+        StatsBackend() # pylint: disable=abstract-class-instantiated
+
+def test_start_fails_if_worker_dies(tmp_path: Path) -> None:
+    """ Worker failing to open its database fails start instead of hanging."""
+    backend = RemoteBackend(StatsStore({}), str(tmp_path / "missing" / "stats.db"), start_timeout=60)
+
+    async def run() -> None:
+        with pytest.raises(RuntimeError, match="exited"):
+            await backend.start()
+        await backend.close()
+
+    asyncio.run(asyncio.wait_for(run(), 30))
+
+def test_requests_fail_once_worker_dies(tmp_path: Path) -> None:
+    """ Queries waiting on a dead worker fail at once and new ones are refused."""
+    backend = RemoteBackend(StatsStore({}), str(tmp_path / "stats.db"), timeout=60)
+
+    async def run() -> None:
+        await backend.start()
+        assert await backend.query("marks", 1) == {}
+        backend.process.kill()
+        with pytest.raises(RuntimeError):
+            await backend.query("marks", 1)
+        with pytest.raises(RuntimeError):
+            backend.publish("close_voice", 0.0)
+        await backend.close()
+
+    asyncio.run(asyncio.wait_for(run(), 30))
@@ -0,0 +1,36 @@
+""" Statistics containers tests."""
+
+from __future__ import annotations
+from collections import Counter
+import random
+
+from storage import TopWords, Vocabulary, WordCounts
+
+def test_top_words_floor_follows_grown_top_word() -> None:
+    """ Growing a top word moves the floor, so newcomers do not evict it."""
+    top = TopWords(2)
+    for word_id, count in ((0, 1), (0, 2), (0, 3), (0, 4), (0, 5), (1, 1), (1, 2), (1, 3), (1, 4), (1, 5)):
+        top.update(word_id, count)
+    for count in range(1, 5):
+        top.update(2, count)
+    assert sorted(top.items(2)) == [(0, 5), (1, 5)]
+
+def test_word_counts_top_matches_most_common() -> None:
+    """ Incremental top equals full sort after random adds and removes."""
+    rng = random.Random(1)
+    for _ in range(200):
+        words = WordCounts(Vocabulary())
+        words.top = TopWords(rng.randint(1, 6))
+        added: list[int] = []
+        for _ in range(rng.randint(1, 300)):
+            if added and rng.random() < 0.2:
+                word_id = added.pop(rng.randrange(len(added)))
+                words.remove_ids([word_id])
+            else:
+                word_id = rng.randint(0, 15)
+                added.append(word_id)
+                words.add_ids([word_id])
+        expected = Counter(added)
+        top = words.top.items(words.top.capacity)
+        assert all(expected[word_id] == count for word_id, count in top)
+        assert [_[1] for _ in top] == [_[1] for _ in expected.most_common(words.top.capacity)]